@@ -1,9 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import asyncio
 import logging
 
-from app.routers import documents, chat
-from app.services.milvus_service import init_collection
+from app.routers import documents, chat, admin
+from app.config import get_settings
+from app.services.warmup_service import run_warmup, get_warmup_state, is_ready
+from app.services.maintenance_service import compaction_scheduler
+from app.services.admission_service import AdmissionRejected
+from app.middleware import UploadSizeLimitMiddleware
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,17 +30,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 上传大小在 multipart 解析之前限制，超限请求不会被读入临时文件
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path="/api/documents/upload",
+    max_body_size=get_settings().max_file_size,
+)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """资源饱和：返回 429 并提示重试时间"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "resource": exc.resource},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 app.include_router(documents.router, prefix="/api")
 app.include_router(chat.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
+
+
+_background_tasks: list[asyncio.Task] = []
 
 
 @app.on_event("startup")
 async def startup_event():
-    """服务启动时初始化 Milvus Collection"""
-    init_collection()
-    print("✅ Milvus Collection 初始化完成")
+    """服务启动时在后台预热（初始化/加载 Collection、创建客户端、试检索），不阻塞端口监听"""
+    _background_tasks.append(asyncio.create_task(run_warmup()))
+    if get_settings().compaction_check_interval > 0:
+        _background_tasks.append(asyncio.create_task(compaction_scheduler()))
 
 
 @app.get("/api/health")
+@app.get("/api/health/live")
 async def health_check():
+    """存活探针：进程可响应即返回 ok"""
     return {"status": "ok", "message": "知识库助手服务运行中"}
+
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """就绪探针：预热完成前返回 503 及当前进度"""
+    state = get_warmup_state()
+    if is_ready():
+        return {"status": "ready", "warmup": state}
+    return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": state})
@@ -0,0 +1,66 @@
+import json
+
+from starlette.exceptions import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# multipart 边界、各部分头及表单字段（tag 等）的额外字节预留
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """在 multipart 解析之前限制上传请求体大小
+
+    - 带 Content-Length 的请求超限直接返回 413，不读取请求体
+    - 分块传输（无 Content-Length）或声明不实的请求，边接收边计数，超限立即中止解析并返回 413
+    """
+
+    def __init__(self, app: ASGIApp, path: str, max_body_size: int):
+        self.app = app
+        self.path = path
+        self.max_body_size = max_body_size + MULTIPART_OVERHEAD
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_body_size:
+                    await self._reject(send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # 从 receive 中抛出的 HTTPException 会被 FastAPI 原样传递给异常处理器
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"文件过大，最大支持 {(self.max_body_size - MULTIPART_OVERHEAD) // (1024 * 1024)}MB"
+
+    async def _reject(self, send: Send):
+        body = json.dumps({"detail": self._detail()}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
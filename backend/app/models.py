@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
 
 
@@ -9,6 +9,7 @@ class DocumentInfo(BaseModel):
     doc_type: str
     chunk_count: int
     created_at: str
+    tag: str = ""
 
 
 class ChatMessage(BaseModel):
@@ -21,6 +22,8 @@ class ChatRequest(BaseModel):
     top_k: Optional[int] = 5
     stream: Optional[bool] = True
     doc_id: Optional[str] = None  # 指定文档 ID，None 表示全部文档
+    doc_ids: Optional[list[str]] = None  # 限定在多个文档内检索
+    tag: Optional[str] = None  # 限定在某个标签（租户/分组）下检索
 
 
 class ChatResponse(BaseModel):
@@ -33,6 +36,8 @@ class UploadResponse(BaseModel):
     doc_name: str
     chunk_count: int
     message: str
+    tag: str = ""
+    content_hash: str = ""  # 文件内容 SHA-256
 
 
 class DeleteResponse(BaseModel):
@@ -40,6 +45,19 @@ class DeleteResponse(BaseModel):
     doc_id: str
 
 
+class BulkDeleteRequest(BaseModel):
+    doc_ids: Optional[list[str]] = None
+    name_pattern: Optional[str] = None  # 文件名模式，% 为唯一通配符（_ 按字面匹配），如 "report_%"
+    older_than_days: Optional[int] = Field(default=None, ge=1)  # 0 会匹配全部文档，不允许
+    soft: bool = False  # 软删除：仅在检索和列表中隐藏，等待下次 compaction 清理
+
+
+class BulkDeleteResponse(BaseModel):
+    message: str
+    doc_ids: list[str]
+    deleted_rows: int = 0
+
+
 class DocumentChunk(BaseModel):
     chunk_index: int
     content: str
@@ -51,5 +69,11 @@ class DocumentPreviewResponse(BaseModel):
     doc_type: str
     chunk_count: int
     chunks: list[DocumentChunk]
+    next_cursor: Optional[int] = None  # 分页模式下下一页的 after 参数，None 表示已到末尾
 
 
+class MigrationRequest(BaseModel):
+    embedding_backend: Literal["zhipu", "local"] = "zhipu"
+    embedding_model: str
+    embedding_dim: Optional[int] = Field(default=None, gt=0)  # 智谱必填；本地后端取模型输出维度，填写时须一致
+    rate: Optional[float] = Field(default=None, gt=0)  # 每秒重新向量化的块数上限
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException
+import logging
+
+from app.models import MigrationRequest
+from app.services.migration_service import start_migration, cancel_migration, get_migration_state
+from app.services.admission_service import get_admission_stats
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/migration")
+async def migration_status():
+    """查看 embedding 迁移进度、吞吐量与状态"""
+    return get_migration_state()
+
+
+@router.post("/migration")
+async def create_migration(request: MigrationRequest):
+    """启动蓝绿迁移：后台按新模型重新向量化到新 collection，完成后通过别名原子切换"""
+    try:
+        return await start_migration(
+            request.embedding_backend, request.embedding_model, request.embedding_dim, request.rate
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error("启动迁移失败: %s", e)
+        raise HTTPException(status_code=500, detail=f"启动迁移失败: {str(e)}")
+
+
+@router.post("/migration/cancel")
+async def stop_migration():
+    """取消进行中的迁移，已写入的新 collection 会被删除；切换阶段开始后不可取消"""
+    if not cancel_migration():
+        raise HTTPException(status_code=404, detail="没有可取消的迁移任务（切换阶段开始后不可取消）")
+    return {"message": "已请求取消迁移"}
+
+
+@router.get("/scheduler")
+async def scheduler_stats():
+    """各资源的并发占用、排队深度、等待时间与拒绝次数，用于容量规划"""
+    return get_admission_stats()
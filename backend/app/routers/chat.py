@@ -1,11 +1,20 @@
-from fastapi import APIRouter, HTTPException
+import threading
+from contextlib import aclosing
+
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
+from app.config import get_settings
 from app.models import ChatRequest, ChatResponse
 from app.services.rag_service import rag_chat_stream, rag_chat
 from app.services.milvus_service import get_document_meta
+from app.services import admission_service as admission
+from app.services.admission_service import AdmissionRejected, Priority
+from app.utils.sse import encode_event, gzip_stream
 
 router = APIRouter(prefix="/chat", tags=["chat"])
+settings = get_settings()
 
 
 def _resolve_doc_name(doc_id: str | None) -> str | None:
@@ -21,34 +30,81 @@ def _resolve_doc_name(doc_id: str | None) -> str | None:
     return None
 
 
+def _resolve_scope(request: ChatRequest) -> tuple[list[str], str | None, str | None]:
+    """解析检索范围，返回 (doc_ids, tag, 范围描述)；范围描述为 None 表示全库"""
+    doc_ids = list(dict.fromkeys(request.doc_ids or []))
+    if request.doc_id and request.doc_id not in doc_ids:
+        doc_ids.insert(0, request.doc_id)
+    tag = request.tag or None
+
+    scope = None
+    if len(doc_ids) == 1:
+        doc_name = _resolve_doc_name(doc_ids[0])
+        scope = f"文档《{doc_name}》" if doc_name else None
+    elif doc_ids:
+        scope = f"所选的 {len(doc_ids)} 篇文档"
+    if tag:
+        scope = f"标签「{tag}」下的{scope or '文档'}"
+    return doc_ids, tag, scope
+
+
 @router.post("/stream")
-async def chat_stream(request: ChatRequest):
+async def chat_stream(request: ChatRequest, http_request: Request):
     """流式 RAG 问答（SSE）"""
     if not request.messages:
         raise HTTPException(status_code=400, detail="消息不能为空")
 
     messages = [{"role": m.role, "content": m.content} for m in request.messages]
     top_k = request.top_k or 5
-    doc_id = request.doc_id or None
-    doc_name = _resolve_doc_name(doc_id)
+    doc_ids, tag, scope = _resolve_scope(request)
+
+    # 在返回 200 之前获取生成名额，饱和时由全局处理器返回 429 + Retry-After
+    acquired_at = await admission.acquire("chat", Priority.INTERACTIVE)
+    stop = threading.Event()
+    released = False
+    started = False
+
+    def release_slot():
+        nonlocal released
+        if not released:
+            released = True
+            admission.release("chat", acquired_at)
 
     async def event_generator():
+        nonlocal started
+        started = True
         try:
-            async for chunk in rag_chat_stream(
-                messages, top_k=top_k, doc_id=doc_id, doc_name=doc_name
-            ):
-                yield chunk
+            async with aclosing(rag_chat_stream(
+                messages, top_k=top_k, doc_ids=doc_ids, tag=tag, scope=scope, stop=stop, on_exit=release_slot
+            )) as stream:
+                async for chunk in stream:
+                    yield chunk
         except Exception as e:
-            import json
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield encode_event({"type": "error", "message": str(e)})
+
+    events = event_generator()
+
+    async def finish():
+        # 响应结束（含客户端提前断开）：通知 GLM 线程停止并关闭生成器，名额在线程退出后由 rag_chat_stream 归还；
+        # 生成器从未运行（响应体开始前即断开）时不会有线程，直接归还
+        stop.set()
+        await events.aclose()
+        if not started:
+            release_slot()
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    }
+    body = events
+    accept_encoding = http_request.headers.get("accept-encoding", "")
+    if settings.stream_compression and "gzip" in accept_encoding.lower():
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
 
     return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",
-        }
+        body, media_type="text/event-stream", headers=headers, background=BackgroundTask(finish)
     )
 
 
@@ -60,13 +116,14 @@ async def chat(request: ChatRequest):
 
     messages = [{"role": m.role, "content": m.content} for m in request.messages]
     top_k = request.top_k or 5
-    doc_id = request.doc_id or None
-    doc_name = _resolve_doc_name(doc_id)
+    doc_ids, tag, scope = _resolve_scope(request)
 
     try:
         result = await rag_chat(
-            messages, top_k=top_k, doc_id=doc_id, doc_name=doc_name
+            messages, top_k=top_k, doc_ids=doc_ids, tag=tag, scope=scope
         )
         return ChatResponse(answer=result["answer"], sources=result["sources"])
+    except AdmissionRejected:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"问答失败: {str(e)}")
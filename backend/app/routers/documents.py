@@ -1,24 +1,40 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pathlib import Path
-import os
+from typing import Optional
+from datetime import datetime, timedelta
+import asyncio
+import json
+import numpy as np
 import logging
 
 from app.config import get_settings
-from app.models import UploadResponse, DeleteResponse, DocumentInfo, DocumentChunk, DocumentPreviewResponse
-from app.services.document_service import parse_document, generate_doc_id, save_upload_file
-from app.services.embedding_service import get_embeddings
-from app.services.milvus_service import insert_chunks, list_documents, delete_document, document_exists, get_document_chunks
+from app.models import (
+    UploadResponse, DeleteResponse, DocumentInfo, DocumentChunk, DocumentPreviewResponse,
+    BulkDeleteRequest, BulkDeleteResponse,
+)
+from app.services.document_service import parse_document, generate_doc_id, hash_upload_file, FileTooLargeError
+from app.services.embedding_service import get_embeddings, get_backend
+from app.services import admission_service as admission
+from app.services.admission_service import AdmissionRejected, Priority
+from app.services.milvus_service import (
+    insert_chunks, list_documents, delete_document, document_exists, get_document_meta,
+    get_document_chunks, get_document_chunks_page, count_document_chunks,
+    delete_documents, find_document_ids, soft_delete_documents, restore_documents, WritesPausedError,
+)
+from app.services.maintenance_service import get_compaction_status, run_compaction
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/documents", tags=["documents"])
 settings = get_settings()
 
 ALLOWED_EXTENSIONS = {".pdf", ".docx", ".doc", ".txt", ".md"}
+PREVIEW_STREAM_BATCH = 200
 
 
 @router.post("/upload", response_model=UploadResponse)
-async def upload_document(file: UploadFile = File(...)):
-    """上传并处理文档：解析 → 分块 → 向量化 → 存入 Milvus"""
+async def upload_document(file: UploadFile = File(...), tag: str = Form("")):
+    """上传并处理文档：解析 → 分块 → 向量化 → 存入 Milvus；tag 用于按租户/分组限定检索"""
     filename = file.filename or ""
     ext = Path(filename).suffix.lower()
 
@@ -31,43 +47,71 @@ async def upload_document(file: UploadFile = File(...)):
             detail=f"不支持的文件类型 {ext}，支持：{', '.join(ALLOWED_EXTENSIONS)}"
         )
 
-    content = await file.read()
-    if len(content) > settings.max_file_size:
-        raise HTTPException(status_code=413, detail="文件过大，最大支持 20MB")
+    tag = tag.strip()
+    if len(tag) > 64:
+        raise HTTPException(status_code=400, detail="标签长度不能超过 64 个字符")
+
+    # 请求体已由 UploadSizeLimitMiddleware 在解析前限制，这里按文件部分的实际大小再校验一次
+    if file.size is not None and file.size > settings.max_file_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"文件过大，最大支持 {settings.max_file_size // (1024 * 1024)}MB"
+        )
 
-    file_path: str | None = None
     try:
-        file_path = await save_upload_file(content, filename)
+        # 直接读取 multipart 解析生成的临时文件计算内容哈希，不再复制落盘
+        content_hash = await hash_upload_file(file)
 
-        # 解析文档 → 分块
-        chunks = await parse_document(file_path, filename)
+        # 解析文档 → 分块（同一临时文件，已回到开头）；在线程池中执行，不阻塞其他请求与流式问答
+        chunks = await asyncio.to_thread(parse_document, file.file, filename)
 
         # 生成文档 ID
         doc_id = generate_doc_id(filename)
 
-        # 批量向量化
-        embeddings = get_embeddings(chunks)
+        # 批量向量化：按 API 批次逐批申请名额（入库优先级，让位于交互式查询）；
+        # 固定使用开始时的模型，期间别名被切换时由 insert_chunks 拒绝，不会混入不同模型的向量。
+        # 结果逐批写入预先分配的 float32 数组，整篇文档的向量只驻留一份
+        backend = await asyncio.to_thread(get_backend)
+        batch_size = backend.request_batch_size
+        embeddings = np.empty((len(chunks), backend.dim), dtype=np.float32)
+        for i in range(0, len(chunks), batch_size):
+            async with admission.slot("embedding", Priority.INGEST):
+                embeddings[i:i + batch_size] = await asyncio.to_thread(
+                    get_embeddings, chunks[i:i + batch_size], backend
+                )
 
-        # 存入 Milvus
+        # 向量存入 Milvus，文本存入 chunk_store
         doc_type = ext.lstrip(".")
-        count = insert_chunks(
-            doc_id=doc_id,
-            doc_name=filename,
-            doc_type=doc_type,
-            chunks=chunks,
-            embeddings=embeddings
-        )
+        async with admission.slot("milvus", Priority.INGEST):
+            count = await asyncio.to_thread(
+                insert_chunks,
+                doc_id=doc_id,
+                doc_name=filename,
+                doc_type=doc_type,
+                chunks=chunks,
+                embeddings=embeddings,
+                tag=tag,
+                embedding_model=backend.model_name
+            )
 
         return UploadResponse(
             doc_id=doc_id,
             doc_name=filename,
             chunk_count=count,
-            message=f"文档上传成功，共生成 {count} 个知识块"
+            message=f"文档上传成功，共生成 {count} 个知识块",
+            tag=tag,
+            content_hash=content_hash
         )
 
-    except HTTPException:
+    except (HTTPException, AdmissionRejected):
         raise
 
+    except WritesPausedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
     except ValueError as e:
         # 文档解析/分块失败（业务错误）
         logger.warning("文档解析失败 [%s]: %s", filename, e)
@@ -79,57 +123,177 @@ async def upload_document(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"处理文档失败: {e}")
 
     finally:
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
+        await file.close()
 
 
 @router.get("/list", response_model=list[DocumentInfo])
 async def get_documents():
     """获取知识库中所有文档列表"""
     try:
-        docs = list_documents()
+        # 列表与预览只读 chunk_store（SQLite），不经过 Milvus 准入名额
+        docs = await asyncio.to_thread(list_documents)
         return [DocumentInfo(**doc) for doc in docs]
     except Exception as e:
         logger.error("获取文档列表失败: %s", e)
         raise HTTPException(status_code=500, detail=f"获取文档列表失败: {str(e)}")
 
 
+@router.post("/bulk-delete", response_model=BulkDeleteResponse)
+async def bulk_delete_documents(request: BulkDeleteRequest):
+    """批量删除：按 ID 列表 / 文件名模式 / 上传时间筛选文档，再按 doc_id 合并为一个表达式一次删除"""
+    created_before = None
+    if request.older_than_days is not None:
+        created_before = (datetime.now() - timedelta(days=request.older_than_days)).isoformat()
+    if not (request.doc_ids or request.name_pattern or created_before):
+        raise HTTPException(status_code=400, detail="请至少指定一个删除条件")
+
+    try:
+        doc_ids = await asyncio.to_thread(
+            find_document_ids, request.doc_ids, request.name_pattern, created_before
+        )
+        if not doc_ids:
+            return BulkDeleteResponse(message="没有匹配的文档", doc_ids=[])
+        if request.soft:
+            await asyncio.to_thread(soft_delete_documents, doc_ids)
+            return BulkDeleteResponse(message=f"已软删除 {len(doc_ids)} 个文档", doc_ids=doc_ids)
+        # 按匹配到的 doc_id 删除，保证 name_pattern / 时间条件下删除整篇文档
+        async with admission.slot("milvus", Priority.INGEST):
+            rows = await asyncio.to_thread(delete_documents, doc_ids)
+        return BulkDeleteResponse(
+            message=f"已删除 {len(doc_ids)} 个文档", doc_ids=doc_ids, deleted_rows=rows
+        )
+    except AdmissionRejected:
+        raise
+    except WritesPausedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.error("批量删除失败: %s", e)
+        raise HTTPException(status_code=500, detail=f"批量删除失败: {str(e)}")
+
+
+@router.get("/maintenance/compaction")
+async def compaction_status():
+    """查看墓碑数量与最近的 compaction 记录（含前后检索延迟）"""
+    return get_compaction_status()
+
+
+@router.post("/maintenance/compaction")
+async def trigger_compaction():
+    """立即清理软删除文档并执行 compaction"""
+    try:
+        return await run_compaction()
+    except Exception as e:
+        logger.error("compaction 失败: %s", e)
+        raise HTTPException(status_code=500, detail=f"compaction 失败: {str(e)}")
+
+
 @router.delete("/{doc_id}", response_model=DeleteResponse)
-async def remove_document(doc_id: str):
-    """从知识库删除指定文档"""
+async def remove_document(doc_id: str, soft: bool = Query(False, description="软删除")):
+    """从知识库删除指定文档；soft=true 时仅从检索中隐藏"""
     try:
-        if not document_exists(doc_id):
+        if not await asyncio.to_thread(document_exists, doc_id, not soft):
             raise HTTPException(status_code=404, detail="文档不存在")
-        delete_document(doc_id)
+        if soft:
+            await asyncio.to_thread(soft_delete_documents, [doc_id])
+            return DeleteResponse(message="文档已软删除", doc_id=doc_id)
+        async with admission.slot("milvus", Priority.INTERACTIVE):
+            await asyncio.to_thread(delete_document, doc_id)
         return DeleteResponse(message="文档已删除", doc_id=doc_id)
-    except HTTPException:
+    except (HTTPException, AdmissionRejected):
         raise
+    except WritesPausedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         logger.error("删除文档失败 [%s]: %s", doc_id, e)
         raise HTTPException(status_code=500, detail=f"删除文档失败: {str(e)}")
 
 
+@router.post("/{doc_id}/restore", response_model=DeleteResponse)
+async def restore_document(doc_id: str):
+    """撤销软删除"""
+    if not restore_documents([doc_id]):
+        raise HTTPException(status_code=404, detail="文档不在软删除列表中")
+    return DeleteResponse(message="文档已恢复", doc_id=doc_id)
+
+
 @router.get("/{doc_id}/preview", response_model=DocumentPreviewResponse)
-async def preview_document(doc_id: str):
-    """获取文档所有文本块用于预览"""
+async def preview_document(
+    doc_id: str,
+    after: Optional[int] = Query(None, ge=-1, description="游标：返回 chunk_index 大于该值的块"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页块数，不传则返回全部"),
+    stream: bool = Query(False, description="以 NDJSON 流式返回全部块"),
+):
+    """获取文档文本块用于预览，支持按 chunk_index 游标分页及 NDJSON 流式返回"""
     try:
-        if not document_exists(doc_id):
+        meta = await asyncio.to_thread(get_document_meta, doc_id)
+        if not meta:
             raise HTTPException(status_code=404, detail="文档不存在")
-        chunks = get_document_chunks(doc_id)
-        if not chunks:
-            raise HTTPException(status_code=404, detail="文档内容为空")
+        total = await asyncio.to_thread(count_document_chunks, doc_id)
+
+        if stream:
+            return StreamingResponse(
+                _preview_ndjson(doc_id, meta, total),
+                media_type="application/x-ndjson",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        next_cursor = None
+        if limit is None and after is None:
+            chunks = await asyncio.to_thread(get_document_chunks, doc_id)
+        else:
+            cursor = -1 if after is None else after
+            page_size = limit or 100
+            chunks = await asyncio.to_thread(get_document_chunks_page, doc_id, cursor, page_size)
+            # 以本页最后一块的 chunk_index 作为游标，chunk_index 不连续时也不会漏块
+            if len(chunks) == page_size:
+                next_cursor = chunks[-1]["chunk_index"]
+
         return DocumentPreviewResponse(
             doc_id=doc_id,
-            doc_name=chunks[0]["doc_name"],
-            doc_type=chunks[0].get("doc_type", ""),
-            chunk_count=len(chunks),
+            doc_name=meta["doc_name"],
+            doc_type=meta.get("doc_type", ""),
+            chunk_count=total,
             chunks=[
                 DocumentChunk(chunk_index=c["chunk_index"], content=c["content"])
                 for c in chunks
-            ]
+            ],
+            next_cursor=next_cursor,
         )
     except HTTPException:
         raise
     except Exception as e:
         logger.error("获取文档预览失败 [%s]: %s", doc_id, e)
         raise HTTPException(status_code=500, detail=f"获取预览失败: {str(e)}")
+
+
+async def _preview_ndjson(doc_id: str, meta: dict, total: int):
+    """NDJSON 流：首行为文档元信息，之后每行一个文本块，最后一行为结束标记"""
+    yield json.dumps({
+        "type": "meta",
+        "doc_id": doc_id,
+        "doc_name": meta["doc_name"],
+        "doc_type": meta.get("doc_type", ""),
+        "chunk_count": total,
+    }, ensure_ascii=False) + "\n"
+
+    cursor = -1
+    try:
+        while True:
+            # 每批是一次独立的游标查询，放到线程池执行；不跨 await 持有生成器，内存只保留一批
+            batch = await asyncio.to_thread(get_document_chunks_page, doc_id, cursor, PREVIEW_STREAM_BATCH)
+            if not batch:
+                break
+            yield "".join(
+                json.dumps(
+                    {"type": "chunk", "chunk_index": c["chunk_index"], "content": c["content"]},
+                    ensure_ascii=False,
+                ) + "\n"
+                for c in batch
+            )
+            if len(batch) < PREVIEW_STREAM_BATCH:
+                break
+            cursor = batch[-1]["chunk_index"]
+        yield json.dumps({"type": "done"}) + "\n"
+    except Exception as e:
+        logger.error("流式预览失败 [%s]: %s", doc_id, e)
+        yield json.dumps({"type": "error", "message": str(e)}, ensure_ascii=False) + "\n"
@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import itertools
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class Priority(IntEnum):
+    """数值越小越优先：交互式问答优先于文档入库"""
+    INTERACTIVE = 0
+    INGEST = 1
+
+
+class AdmissionRejected(Exception):
+    """资源饱和（排队已满或等待超时），由全局异常处理器转换为 429 + Retry-After"""
+
+    def __init__(self, resource: str, retry_after: int):
+        super().__init__(f"服务繁忙（{resource}），请 {retry_after} 秒后重试")
+        self.resource = resource
+        self.retry_after = retry_after
+
+
+class ResourceLimiter:
+    """带优先级与有界排队的并发限制器（仅在事件循环线程中使用）"""
+
+    def __init__(self, name: str, capacity: int, max_queue: int):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self._in_use = 0
+        self._queued = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._waits: Deque[float] = deque(maxlen=1000)  # 最近的排队等待时间（秒）
+        self._hold_ema = 0.0  # 单次占用时长的指数滑动平均（秒）
+        self.granted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _retry_after(self) -> int:
+        backlog = (self._queued + 1) / max(self.capacity, 1)
+        return max(1, round(backlog * (self._hold_ema or 1.0)))
+
+    async def acquire(self, priority: Priority, max_wait: float) -> None:
+        if self._in_use < self.capacity and not self._queued:
+            self._in_use += 1
+            self.granted += 1
+            self._waits.append(0.0)
+            return
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.name, self._retry_after())
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), fut))
+        self._queued += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(fut, max_wait)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise AdmissionRejected(self.name, self._retry_after()) from None
+        except asyncio.CancelledError:
+            # 名额已转交但调用方被取消（如客户端断开），归还名额
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+        finally:
+            self._queued -= 1
+        self.granted += 1
+        self._waits.append(time.perf_counter() - start)
+
+    def release(self, held: Optional[float] = None) -> None:
+        if held is not None:
+            self._hold_ema = held if not self._hold_ema else 0.9 * self._hold_ema + 0.1 * held
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():  # 已超时/取消的等待者直接跳过
+                fut.set_result(None)  # 名额直接转交，in_use 不变
+                return
+        self._in_use -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        return {
+            "capacity": self.capacity,
+            "in_use": self._in_use,
+            "queued": self._queued,
+            "max_queue": self.max_queue,
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms_p50": round(statistics.median(waits) * 1000, 2) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95) - 1] * 1000, 2) if len(waits) >= 20 else None,
+            "wait_ms_max": round(waits[-1] * 1000, 2) if waits else 0.0,
+            "avg_hold_ms": round(self._hold_ema * 1000, 2),
+        }
+
+
+_limiters: Dict[str, ResourceLimiter] = {
+    # GLM 对话生成（流式占用整个生成过程）
+    "chat": ResourceLimiter("chat", settings.max_concurrent_chat, settings.admission_max_queue),
+    # embedding API：查询向量化（交互）与文档入库向量化共享，查询优先
+    "embedding": ResourceLimiter("embedding", settings.max_concurrent_embedding, settings.admission_max_queue),
+    # Milvus 检索 / 写入 / 删除；文档列表与预览只读 chunk_store（SQLite），不占用此名额
+    "milvus": ResourceLimiter("milvus", settings.max_concurrent_milvus, settings.admission_max_queue),
+}
+
+
+def _max_wait(priority: Priority) -> float:
+    if priority == Priority.INTERACTIVE:
+        return settings.admission_max_wait
+    return settings.admission_ingest_max_wait
+
+
+async def acquire(resource: str, priority: Priority = Priority.INTERACTIVE) -> float:
+    """获取资源名额，返回获取时刻（传给 release 用于统计占用时长）；饱和时抛出 AdmissionRejected"""
+    await _limiters[resource].acquire(priority, _max_wait(priority))
+    return time.perf_counter()
+
+
+def release(resource: str, acquired_at: Optional[float] = None) -> None:
+    held = time.perf_counter() - acquired_at if acquired_at else None
+    _limiters[resource].release(held)
+
+
+@asynccontextmanager
+async def slot(resource: str, priority: Priority = Priority.INTERACTIVE) -> AsyncIterator[None]:
+    acquired_at = await acquire(resource, priority)
+    try:
+        yield
+    finally:
+        release(resource, acquired_at)
+
+
+def get_admission_stats() -> Dict[str, Any]:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
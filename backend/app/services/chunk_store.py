@@ -0,0 +1,339 @@
+"""本地块文本存储：文本与文档元数据按块 id 存放在 SQLite 中，Milvus 只保留 id / doc_id / tag / 向量
+
+- 每块正文以 zlib 压缩后存为 BLOB，读取时解压，不受 Milvus VARCHAR 长度限制
+- 数据库以 WAL 模式打开并启用 mmap，批量按 id 查询走主键、按文档 / 相邻块查询走 (doc_id, chunk_index) 索引
+- 每个线程使用独立连接（FastAPI 线程池 / asyncio.to_thread），写入由 SQLite 自身加锁
+- 软删除登记与墓碑计数等运行状态也存放在这里，随数据一起持久化，多进程共享
+"""
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from app.config import get_settings
+
+settings = get_settings()
+
+COMPRESS_LEVEL = 6
+QUERY_BATCH = 500  # IN (...) 单次参数个数，低于 SQLite 默认变量上限
+
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks (doc_id, chunk_index);
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    doc_name TEXT NOT NULL,
+    doc_type TEXT NOT NULL DEFAULT '',
+    tag TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS soft_deleted (
+    doc_id TEXT PRIMARY KEY,
+    deleted_at TEXT NOT NULL DEFAULT ''
+);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        path = settings.chunk_store_path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(settings.chunk_store_mmap_mb) * 1024 * 1024}")
+        # 文件名匹配区分大小写，与 Milvus 的 like 语义一致
+        conn.execute("PRAGMA case_sensitive_like=ON")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), COMPRESS_LEVEL)
+
+
+def _decompress(body: bytes) -> str:
+    return zlib.decompress(body).decode("utf-8")
+
+
+def _batches(items: List[Any], size: int = QUERY_BATCH) -> Iterator[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _placeholders(n: int) -> str:
+    return ", ".join("?" * n)
+
+
+def allocate_ids(count: int) -> List[int]:
+    """预留 count 个连续的块 id（写入 Milvus 前分配，Milvus 主键与之一致）"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        start = int(row["value"]) if row else 1
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('next_id', ?)", (str(start + count),)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return list(range(start, start + count))
+
+
+def put_chunks(rows: Iterable[Dict[str, Any]], ignore_existing: bool = False) -> int:
+    """写入一批块，每行需包含 id、doc_id、chunk_index、content 及文档元数据
+    （doc_name / doc_type / tag / created_at，同一文档只记录首次写入的值）。
+
+    id 已存在时抛出 sqlite3.IntegrityError 并回滚整批，避免静默覆盖其他文档的文本；
+    ignore_existing=True 时跳过已存在的 id，仅用于旧版 collection 回填（中断后重跑）。
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO documents (doc_id, doc_name, doc_type, tag, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            {
+                r["doc_id"]: (
+                    r["doc_id"], r.get("doc_name", ""), r.get("doc_type", ""),
+                    r.get("tag", ""), r.get("created_at", ""),
+                )
+                for r in rows
+            }.values(),
+        )
+        conn.executemany(
+            f"INSERT {'OR IGNORE ' if ignore_existing else ''}INTO chunks (id, doc_id, chunk_index, body) "
+            "VALUES (?, ?, ?, ?)",
+            ((int(r["id"]), r["doc_id"], int(r["chunk_index"]), _compress(r["content"])) for r in rows),
+        )
+        # 外部带入的 id（旧版 collection 的自增主键、快照）之后再分配时不得重复
+        max_id = max(int(r["id"]) for r in rows)
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = MAX(CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))",
+            (str(max_id + 1),),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return len(rows)
+
+
+def _chunk_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "doc_id": row["doc_id"],
+        "chunk_index": row["chunk_index"],
+        "content": _decompress(row["body"]),
+    }
+
+
+def get_chunks(ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """按块 id 批量读取，返回 {id: {doc_id, doc_name, chunk_index, content}}，不存在的 id 不出现在结果中"""
+    conn = _connect()
+    out: Dict[int, Dict[str, Any]] = {}
+    for batch in _batches(list(dict.fromkeys(int(i) for i in ids))):
+        rows = conn.execute(
+            "SELECT c.id, c.doc_id, c.chunk_index, c.body, d.doc_name FROM chunks c "
+            f"LEFT JOIN documents d ON d.doc_id = c.doc_id WHERE c.id IN ({_placeholders(len(batch))})",
+            batch,
+        )
+        for row in rows:
+            chunk = _chunk_dict(row)
+            chunk["doc_name"] = row["doc_name"] or ""
+            out[row["id"]] = chunk
+    return out
+
+
+def get_chunk_doc_ids(ids: List[int]) -> Dict[int, str]:
+    """按块 id 批量读取所属 doc_id（不解压正文），不存在的 id 不出现在结果中"""
+    conn = _connect()
+    out: Dict[int, str] = {}
+    for batch in _batches(list(dict.fromkeys(int(i) for i in ids))):
+        rows = conn.execute(f"SELECT id, doc_id FROM chunks WHERE id IN ({_placeholders(len(batch))})", batch)
+        out.update((row["id"], row["doc_id"]) for row in rows)
+    return out
+
+
+def get_chunk_range(doc_id: str, first: int, last: int) -> List[Dict[str, Any]]:
+    """读取文档中 chunk_index 位于 [first, last] 的块，升序排列（用于分页与相邻块扩展）"""
+    rows = _connect().execute(
+        "SELECT id, doc_id, chunk_index, body FROM chunks "
+        "WHERE doc_id = ? AND chunk_index BETWEEN ? AND ? ORDER BY chunk_index",
+        (doc_id, int(first), int(last)),
+    )
+    return [_chunk_dict(row) for row in rows]
+
+
+def get_chunks_after(doc_id: str, after: int, limit: int) -> List[Dict[str, Any]]:
+    """游标分页：读取文档中 chunk_index 大于 after 的前 limit 个块，升序排列"""
+    rows = _connect().execute(
+        "SELECT id, doc_id, chunk_index, body FROM chunks "
+        "WHERE doc_id = ? AND chunk_index > ? ORDER BY chunk_index LIMIT ?",
+        (doc_id, int(after), int(limit)),
+    )
+    return [_chunk_dict(row) for row in rows]
+
+
+def iter_chunks(doc_id: str, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+    """按 chunk_index 升序分批遍历文档的全部块"""
+    after = -1
+    while True:
+        batch = get_chunks_after(doc_id, after, batch_size)
+        if not batch:
+            return
+        yield batch
+        after = batch[-1]["chunk_index"]
+
+
+def count_chunks(doc_id: str) -> int:
+    row = _connect().execute("SELECT COUNT(*) AS n FROM chunks WHERE doc_id = ?", (doc_id,)).fetchone()
+    return row["n"]
+
+
+def count_all_chunks() -> int:
+    return _connect().execute("SELECT COUNT(*) AS n FROM chunks").fetchone()["n"]
+
+
+def get_document(doc_id: str) -> Optional[Dict[str, Any]]:
+    row = _connect().execute("SELECT * FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_documents(exclude: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+    """全部文档及其块数，按上传时间排序"""
+    rows = _connect().execute(
+        "SELECT d.*, (SELECT COUNT(*) FROM chunks c WHERE c.doc_id = d.doc_id) AS chunk_count "
+        "FROM documents d ORDER BY d.created_at"
+    )
+    exclude = exclude or set()
+    return [dict(row) for row in rows if row["doc_id"] not in exclude]
+
+
+def find_document_ids(
+    doc_ids: Optional[List[str]] = None,
+    name_pattern: Optional[str] = None,
+    created_before: Optional[str] = None,
+) -> List[str]:
+    """按条件查找文档，多个条件之间为 and；created_before 为 ISO 时间
+
+    name_pattern 中只有 % 是通配符（匹配任意字符串），_ 与 \\ 按字面匹配，区分大小写。
+    doc_ids 按 QUERY_BATCH 分批放入 IN (...)，不受 SQLite 变量个数上限限制。
+    """
+    clauses: List[str] = []
+    params: List[Any] = []
+    if name_pattern:
+        clauses.append("doc_name LIKE ? ESCAPE '\\'")
+        params.append(name_pattern.replace("\\", "\\\\").replace("_", "\\_"))
+    if created_before:
+        clauses.append("created_at < ?")
+        params.append(created_before)
+    if not clauses and not doc_ids:
+        raise ValueError("请至少指定一个查找条件")
+    conn = _connect()
+    if not doc_ids:
+        rows = conn.execute(f"SELECT doc_id FROM documents WHERE {' AND '.join(clauses)}", params)
+        return [row["doc_id"] for row in rows]
+    found: List[str] = []
+    for batch in _batches(list(dict.fromkeys(doc_ids))):
+        where = " AND ".join([f"doc_id IN ({_placeholders(len(batch))})"] + clauses)
+        rows = conn.execute(f"SELECT doc_id FROM documents WHERE {where}", batch + params)
+        found.extend(row["doc_id"] for row in rows)
+    return found
+
+
+def get_all_document_ids() -> Set[str]:
+    return {row["doc_id"] for row in _connect().execute("SELECT doc_id FROM documents")}
+
+
+def delete_documents(doc_ids: List[str]) -> int:
+    """删除文档及其全部块（同时清除软删除登记），返回删除的块数"""
+    conn = _connect()
+    deleted = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for batch in _batches(list(doc_ids)):
+            marks = _placeholders(len(batch))
+            deleted += conn.execute(f"DELETE FROM chunks WHERE doc_id IN ({marks})", batch).rowcount
+            conn.execute(f"DELETE FROM documents WHERE doc_id IN ({marks})", batch)
+            conn.execute(f"DELETE FROM soft_deleted WHERE doc_id IN ({marks})", batch)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return deleted
+
+
+def get_meta(key: str) -> Optional[str]:
+    row = _connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def set_meta(key: str, value: str):
+    _connect().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def add_meta_int(key: str, delta: int) -> int:
+    """原子地为整数型 meta 值加上 delta（不存在时视为 0），返回新值"""
+    row = _connect().execute(
+        "INSERT INTO meta (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + CAST(excluded.value AS INTEGER) "
+        "RETURNING value",
+        (key, str(int(delta))),
+    ).fetchone()
+    return int(row["value"])
+
+
+def get_soft_deleted() -> Set[str]:
+    return {row["doc_id"] for row in _connect().execute("SELECT doc_id FROM soft_deleted")}
+
+
+def add_soft_deleted(doc_ids: Iterable[str], deleted_at: str = "") -> int:
+    """登记软删除，返回新登记的文档数（已登记的忽略）"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO soft_deleted (doc_id, deleted_at) VALUES (?, ?)",
+            ((doc_id, deleted_at) for doc_id in dict.fromkeys(doc_ids)),
+        )
+        added = conn.total_changes - before
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return added
+
+
+def remove_soft_deleted(doc_ids: Iterable[str]) -> int:
+    """撤销软删除登记，返回实际移除的文档数"""
+    conn = _connect()
+    removed = 0
+    for batch in _batches(list(dict.fromkeys(doc_ids))):
+        removed += conn.execute(
+            f"DELETE FROM soft_deleted WHERE doc_id IN ({_placeholders(len(batch))})", batch
+        ).rowcount
+    return removed
@@ -1,9 +1,8 @@
-import os
 import uuid
 import hashlib
 from pathlib import Path
-from typing import List
-import aiofiles
+from typing import BinaryIO, List
+from fastapi import UploadFile
 
 from app.config import get_settings
 from app.utils.text_splitter import TextSplitter
@@ -11,17 +10,20 @@ from app.utils.text_splitter import TextSplitter
 settings = get_settings()
 
 
-async def parse_document(file_path: str, filename: str) -> List[str]:
-    """解析文档，返回文本块列表"""
+def parse_document(source: BinaryIO, filename: str) -> List[str]:
+    """解析文档，返回文本块列表；source 为已定位到开头的二进制文件对象（如上传的临时文件）
+
+    解析与分块均为同步 CPU / 文件 IO，调用方应通过 asyncio.to_thread 在线程池中执行，避免阻塞事件循环。
+    """
     ext = Path(filename).suffix.lower()
     text = ""
 
     if ext == ".pdf":
-        text = await _parse_pdf(file_path)
+        text = _parse_pdf(source)
     elif ext in (".docx", ".doc"):
-        text = await _parse_docx(file_path)
+        text = _parse_docx(source)
     elif ext in (".txt", ".md"):
-        text = await _parse_text(file_path)
+        text = _parse_text(source)
     else:
         raise ValueError(f"不支持的文件类型: {ext}")
 
@@ -40,9 +42,9 @@ async def parse_document(file_path: str, filename: str) -> List[str]:
     return chunks
 
 
-async def _parse_pdf(file_path: str) -> str:
+def _parse_pdf(source: BinaryIO) -> str:
     from pypdf import PdfReader
-    reader = PdfReader(file_path)
+    reader = PdfReader(source)
     texts = []
     for page in reader.pages:
         page_text = page.extract_text()
@@ -51,27 +53,41 @@ async def _parse_pdf(file_path: str) -> str:
     return "\n\n".join(texts)
 
 
-async def _parse_docx(file_path: str) -> str:
+def _parse_docx(source: BinaryIO) -> str:
     from docx import Document
-    doc = Document(file_path)
+    doc = Document(source)
     paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
     return "\n\n".join(paragraphs)
 
 
-async def _parse_text(file_path: str) -> str:
-    async with aiofiles.open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        return await f.read()
+def _parse_text(source: BinaryIO) -> str:
+    return source.read().decode("utf-8", errors="ignore")
 
 
 def generate_doc_id(filename: str) -> str:
     return hashlib.md5(f"{filename}_{uuid.uuid4()}".encode()).hexdigest()
 
 
-async def save_upload_file(file_content: bytes, filename: str) -> str:
-    upload_dir = Path(settings.upload_dir)
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    safe_name = f"{uuid.uuid4()}_{filename}"
-    file_path = upload_dir / safe_name
-    async with aiofiles.open(file_path, "wb") as f:
-        await f.write(file_content)
-    return str(file_path)
+class FileTooLargeError(ValueError):
+    """上传文件超过 max_file_size"""
+
+
+async def hash_upload_file(upload: UploadFile, max_size: int | None = None) -> str:
+    """按固定大小分块读取上传文件计算 SHA-256，读完后回到文件开头供解析使用
+
+    请求体大小已由 UploadSizeLimitMiddleware 在 multipart 解析前限制，这里按实际读取的字节数再校验一次；
+    multipart 解析生成的临时文件直接复用，不再另行落盘复制。
+    """
+    max_size = settings.max_file_size if max_size is None else max_size
+    hasher = hashlib.sha256()
+    size = 0
+    while True:
+        block = await upload.read(settings.upload_chunk_size)
+        if not block:
+            break
+        size += len(block)
+        if size > max_size:
+            raise FileTooLargeError(f"文件过大，最大支持 {max_size // (1024 * 1024)}MB")
+        hasher.update(block)
+    await upload.seek(0)
+    return hasher.hexdigest()
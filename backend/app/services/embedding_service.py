@@ -1,43 +1,218 @@
-from typing import List
-from zhipuai import ZhipuAI
+from __future__ import annotations
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
 
 from app.config import get_settings
 
+if TYPE_CHECKING:
+    from zhipuai import ZhipuAI
+
 settings = get_settings()
 _client = None
+# 按 (后端类型, 模型, 维度) 缓存的后端实例：服务与迁移目标可能同时使用不同的模型
+_backends: Dict[Tuple[str, str, Optional[int]], "EmbeddingBackend"] = {}
+_backend_lock = threading.Lock()
+
+EMBED_BATCH_SIZE = 25  # 单次 API 请求的最大条数
 
 
 def get_client() -> ZhipuAI:
+    """进程内共享的 ZhipuAI 客户端（复用底层 HTTP 连接池），首次调用时才导入 SDK"""
     global _client
     if _client is None:
+        from zhipuai import ZhipuAI
         _client = ZhipuAI(api_key=settings.zhipu_api_key)
     return _client
 
 
-def get_embeddings(texts: List[str]) -> List[List[float]]:
-    """批量获取文本向量，每次最多处理 25 条（API 限制）"""
-    client = get_client()
-    all_embeddings = []
-    batch_size = 25
+class EmbeddingBackend(ABC):
+    """embedding 后端接口：model_name / dim 由后端决定，embed 保持输入顺序
+
+    向量统一以连续的 float32 ndarray 返回（批量为 (n, dim)，单条为 (dim,)），
+    避免每个分量都装箱为 Python float；只在写入 Milvus 时按批转换。
+    """
+
+    kind: str  # 后端类型，与配置 EMBEDDING_BACKEND 的取值一致，记录在 collection 属性中
+    model_name: str
+    dim: int
+    request_batch_size: int = EMBED_BATCH_SIZE  # 调用方单次提交的建议条数（准入控制粒度）
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """批量向量化（文档入库）"""
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """单条查询向量化（交互式，优先低延迟）"""
+        return self.embed([text])[0]
+
+
+class ZhipuEmbeddingBackend(EmbeddingBackend):
+    """智谱 embedding API，模型与维度在创建时确定（embedding-3 通过 dimensions 参数指定输出维度）"""
+
+    kind = "zhipu"
+
+    def __init__(self, model_name: str, dim: int):
+        self.model_name = model_name
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        client = get_client()
+        # embedding-3 支持通过 dimensions 指定输出维度，其余模型维度固定
+        extra = {"dimensions": self.dim} if self.model_name == "embedding-3" else {}
+        parts: List[np.ndarray] = []
+        batch_size = EMBED_BATCH_SIZE
+
+        for i in range(0, len(texts), batch_size):
+            # 截断以满足模型的 token/长度限制
+            batch = [t[:2000] for t in texts[i:i + batch_size]]
+            if not batch:
+                continue
+
+            # 一次请求中发送多个 input，减少 API 调用次数
+            response = client.embeddings.create(
+                model=self.model_name,
+                input=batch,
+                **extra,
+            )
+            # SDK 返回的 data 顺序与输入顺序一致；每批立即转为 float32，释放 Python float 列表
+            parts.append(np.asarray([item.embedding for item in response.data], dtype=np.float32))
+
+        if not parts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
 
-    for i in range(0, len(texts), batch_size):
-        # 截断以满足模型的 token/长度限制
-        batch = [t[:2000] for t in texts[i:i + batch_size]]
-        if not batch:
-            continue
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """本地 CPU 推理（sentence-transformers），维度取模型自身输出维度
 
-        # 一次请求中发送多个 input，减少 API 调用次数
-        response = client.embeddings.create(
-            model=settings.embedding_model,
-            input=batch,
+    批量模式按文本长度排序后动态分批：每批的字符总量不超过 batch_chars，
+    长度相近的文本一起推理以减少 padding；各批提交到专用线程池并行执行。
+    """
+
+    kind = "local"
+
+    def __init__(self, model_name: str, device: str, workers: int, batch_chars: int, max_batch: int):
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "本地 embedding 后端需要安装 sentence-transformers：pip install sentence-transformers"
+            ) from e
+
+        # 多个 worker 并行推理时平分 CPU 核数，避免线程超额订阅
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(workers, 1)))
+        self._model = SentenceTransformer(model_name, device=device)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="local-embed")
+        self._batch_chars = batch_chars
+        self._max_batch = max_batch
+        # 一次提交足够多的文本，才能按长度分批并在线程池中并行
+        self.request_batch_size = max_batch * workers * 4
+        self.model_name = model_name
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self._model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.astype(np.float32, copy=False)
+
+    def _plan_batches(self, texts: List[str]) -> List[List[int]]:
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches: List[List[int]] = []
+        current: List[int] = []
+        longest = 0
+        for i in order:
+            longest = max(longest, len(texts[i]))
+            # 以批内最长文本估算 padding 后的总量
+            if current and (longest * (len(current) + 1) > self._batch_chars
+                            or len(current) >= self._max_batch):
+                batches.append(current)
+                current, longest = [], len(texts[i])
+            current.append(i)
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        results = np.empty((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return results
+        batches = self._plan_batches(texts)
+        futures = [self._executor.submit(self._encode, [texts[i] for i in b]) for b in batches]
+        for batch, future in zip(batches, futures):
+            results[batch] = future.result()  # 按原始顺序写回
+        return results
+
+    def embed_query(self, text: str) -> np.ndarray:
+        # 单条查询直接在调用线程推理，省去线程池切换
+        return self._encode([text])[0]
+
+
+def _create_backend(kind: str, model: str, dim: Optional[int]) -> EmbeddingBackend:
+    if kind == "local":
+        backend: EmbeddingBackend = LocalEmbeddingBackend(
+            model,
+            device=settings.local_embedding_device,
+            workers=settings.local_embedding_workers,
+            batch_chars=settings.local_embedding_batch_chars,
+            max_batch=settings.local_embedding_max_batch,
         )
-        # SDK 返回的 data 顺序与输入顺序一致
-        for item in response.data:
-            all_embeddings.append(item.embedding)
+        if dim is not None and dim != backend.dim:
+            raise ValueError(f"本地模型 {model} 输出 {backend.dim} 维向量，与要求的 {dim} 维不一致")
+        return backend
+    if kind == "zhipu":
+        if dim is None:
+            raise ValueError("智谱 embedding 后端需要指定向量维度")
+        return ZhipuEmbeddingBackend(model, dim)
+    raise ValueError(f"未知的 embedding 后端: {kind}")
+
+
+def get_backend(kind: Optional[str] = None, model: Optional[str] = None, dim: Optional[int] = None) -> EmbeddingBackend:
+    """获取 embedding 后端（按类型/模型/维度缓存，不修改 settings）
+
+    不带参数时返回当前服务 collection 记录的后端与模型，查询与入库都应使用它；
+    迁移时显式传入目标后端。本地后端维度取模型输出维度，传入的 dim 与之不符时抛出 ValueError。
+    """
+    if kind is None:
+        from app.services.milvus_service import get_active_embedding
+        active = get_active_embedding()
+        kind, model, dim = active["backend"], active["model"], active["dim"]
+    key = (kind, model, dim if kind == "zhipu" else None)
+    backend = _backends.get(key)
+    if backend is None:
+        with _backend_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                backend = _create_backend(kind, model, dim)
+                _backends[key] = backend
+    if dim is not None and backend.dim != dim:
+        raise ValueError(f"模型 {model} 输出 {backend.dim} 维向量，与要求的 {dim} 维不一致")
+    return backend
+
+
+def configured_backend() -> EmbeddingBackend:
+    """按 .env 配置（EMBEDDING_BACKEND 等）创建的后端：仅用于新建 collection，已有 collection 以其记录为准"""
+    if settings.embedding_backend == "local":
+        return get_backend("local", settings.local_embedding_model)
+    return get_backend(settings.embedding_backend, settings.embedding_model, settings.embedding_dim)
+
 
-    return all_embeddings
+def get_embeddings(texts: List[str], backend: Optional[EmbeddingBackend] = None) -> np.ndarray:
+    """批量获取文本向量（float32，形状 (n, dim)）；backend 默认为当前服务 collection 的后端"""
+    return (backend or get_backend()).embed(texts)
 
 
-def get_embedding(text: str) -> List[float]:
-    """获取单个文本向量"""
-    return get_embeddings([text])[0]
+def get_embedding(text: str) -> np.ndarray:
+    """获取单个文本向量（float32，形状 (dim,)）"""
+    return get_backend().embed_query(text)
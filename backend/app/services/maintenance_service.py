@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import get_settings
+from app.services.milvus_service import (
+    compact_collection, get_row_count, get_tombstone_count, probe_vector, purge_soft_deleted, search_similar,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_lock = asyncio.Lock()
+_history: List[Dict[str, Any]] = []  # 最近的 compaction 记录
+
+
+def _probe_latency_ms(rounds: int = 20) -> float:
+    """用固定探测向量执行多次检索，返回延迟中位数（毫秒）"""
+    probe = probe_vector()
+    latencies = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        search_similar(probe, top_k=5)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(latencies)
+
+
+def tombstone_ratio() -> float:
+    """墓碑行占（存活行 + 墓碑行）的比例；两者都是持久化 / 实时统计的值，重启后不会归零"""
+    tombstones = get_tombstone_count()
+    live = get_row_count()
+    return tombstones / max(live + tombstones, 1)
+
+
+def get_compaction_status() -> Dict[str, Any]:
+    return {
+        "tombstones": get_tombstone_count(),
+        "threshold": settings.compaction_tombstone_ratio,
+        "check_interval": settings.compaction_check_interval,
+        "running": _lock.locked(),
+        "history": list(_history),
+    }
+
+
+async def run_compaction() -> Dict[str, Any]:
+    """清理软删除文档并执行 compaction，记录前后检索延迟"""
+    async with _lock:
+        purged = await asyncio.to_thread(purge_soft_deleted)
+        ratio = await asyncio.to_thread(tombstone_ratio)
+        before = await asyncio.to_thread(_probe_latency_ms)
+        t0 = time.perf_counter()
+        job_id = await asyncio.to_thread(compact_collection)
+        elapsed = time.perf_counter() - t0
+        after = await asyncio.to_thread(_probe_latency_ms)
+
+        record = {
+            "job_id": job_id,
+            "finished_at": time.time(),
+            "purged_rows": purged,
+            "tombstone_ratio": round(ratio, 4),
+            "duration_seconds": round(elapsed, 2),
+            "search_p50_ms_before": round(before, 2),
+            "search_p50_ms_after": round(after, 2),
+        }
+        _history.append(record)
+        del _history[:-20]
+        logger.info(
+            "compaction 完成：墓碑占比 %.2f%%，检索 p50 %.2fms → %.2fms",
+            ratio * 100, before, after,
+        )
+        return record
+
+
+async def compaction_scheduler(interval: Optional[int] = None) -> None:
+    """定时检查墓碑占比，超过阈值时自动 compaction"""
+    interval = interval or settings.compaction_check_interval
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            ratio = await asyncio.to_thread(tombstone_ratio)
+            if ratio >= settings.compaction_tombstone_ratio and not _lock.locked():
+                await run_compaction()
+        except Exception as e:
+            logger.error("定时 compaction 失败: %s", e)
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.services import chunk_store
+from app.services.embedding_service import EmbeddingBackend, get_backend
+from app.services.milvus_service import (
+    build_document_index, build_scope_filter, create_collection, document_collection_name, drop_collection,
+    get_milvus_client, get_row_count, is_tag_supported, new_collection_name, pause_writes, probe_vector,
+    resolve_collection, resume_writes, switch_alias,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+READ_BATCH = 100
+
+_cancel = threading.Event()
+_task: Optional[asyncio.Task] = None
+_state: Dict[str, Any] = {
+    "status": "idle",  # idle | copying | catching_up | switching | draining | completed | failed | cancelled
+    "source": None,
+    "target": None,
+    "embedding_backend": None,
+    "embedding_model": None,
+    "embedding_dim": None,
+    "rate_limit": None,
+    "total": 0,
+    "processed": 0,
+    "throughput": 0.0,  # 块/秒
+    "started_at": None,
+    "finished_at": None,
+    "error": None,
+}
+
+
+def get_migration_state() -> Dict[str, Any]:
+    state = dict(_state)
+    state["progress"] = round(state["processed"] / state["total"], 4) if state["total"] else 0.0
+    return state
+
+
+def is_running() -> bool:
+    return _task is not None and not _task.done()
+
+
+async def start_migration(
+    embedding_backend: str, embedding_model: str, embedding_dim: Optional[int], rate: Optional[float] = None
+) -> Dict[str, Any]:
+    """启动蓝绿迁移：后台将旧 collection 的文本用目标后端与模型重新向量化写入新 collection，完成后切换别名
+
+    目标后端在启动前创建并校验（本地模型在此加载），配置错误时抛出 ValueError。
+    """
+    global _task
+    if is_running():
+        raise ValueError("已有迁移任务正在进行")
+    backend = await asyncio.to_thread(get_backend, embedding_backend, embedding_model, embedding_dim)
+    _cancel.clear()
+    _state.update(
+        status="copying",
+        source=resolve_collection(),
+        target=None,
+        embedding_backend=backend.kind,
+        embedding_model=backend.model_name,
+        embedding_dim=backend.dim,
+        rate_limit=rate or settings.migration_rate,
+        total=0,
+        processed=0,
+        throughput=0.0,
+        started_at=time.time(),
+        finished_at=None,
+        error=None,
+    )
+    _task = asyncio.create_task(asyncio.to_thread(_run, backend, _state["rate_limit"]))
+    return get_migration_state()
+
+
+def cancel_migration() -> bool:
+    """请求取消迁移；进入切换阶段后不可取消（返回 False）"""
+    if not is_running() or _state["status"] in ("switching", "draining"):
+        return False
+    _cancel.set()
+    return True
+
+
+def _fields() -> List[str]:
+    return ["doc_id"] + (["tag"] if is_tag_supported() else [])
+
+
+def diff_documents(expected: Dict[str, int], copied: Counter) -> Tuple[List[str], List[str]]:
+    """比较块存储中各文档的块数与已写入目标的块数，返回 (需要补写的文档, 需要从目标删除的文档)
+
+    按块数而非 doc_id 比较：复制期间正在上传的文档可能只被读到一部分块，同样需要补写。
+    """
+    stale = sorted(doc_id for doc_id, count in expected.items() if copied.get(doc_id, 0) != count)
+    removed = sorted(doc_id for doc_id in copied if doc_id not in expected)
+    return stale, removed
+
+
+def _write(
+    target: str, rows: List[Dict[str, Any]], texts: List[str], backend: EmbeddingBackend,
+    rate: float, start: float, copied: Counter
+):
+    """用目标后端向量化一批块并 upsert 到 target（块 id 不变，重复写入幂等），按 rate 限速"""
+    t0 = time.perf_counter()
+    embeddings = backend.embed(texts)
+    for row, embedding in zip(rows, embeddings.tolist()):
+        row["embedding"] = embedding
+    get_milvus_client().upsert(collection_name=target, data=rows)
+    copied.update(row["doc_id"] for row in rows)
+    _state["processed"] += len(rows)
+    _state["throughput"] = round(_state["processed"] / (time.perf_counter() - start), 2)
+    # 限速：本批耗时不足 len/rate 秒则补足
+    time.sleep(max(0.0, len(rows) / rate - (time.perf_counter() - t0)))
+
+
+def _copy(source: str, target: str, backend: EmbeddingBackend, rate: float, start: float, copied: Counter):
+    """全量复制：从 source 分批读取块 id，从 chunk_store 取文本重新向量化后写入 target"""
+    client = get_milvus_client()
+    iterator = client.query_iterator(
+        collection_name=source,
+        filter='doc_id != ""',
+        output_fields=_fields(),
+        batch_size=READ_BATCH,
+    )
+    try:
+        while not _cancel.is_set():
+            batch = iterator.next()
+            if not batch:
+                break
+            chunks = chunk_store.get_chunks([r["id"] for r in batch])
+            # 复制期间被删除的文档在 chunk_store 中已不存在，直接跳过
+            batch = [r for r in batch if r["id"] in chunks]
+            if batch:
+                rows = [{"id": r["id"], "doc_id": r["doc_id"], "tag": r.get("tag", "")} for r in batch]
+                _write(target, rows, [chunks[r["id"]]["content"] for r in batch], backend, rate, start, copied)
+    finally:
+        iterator.close()
+
+
+def _catch_up(
+    target: str, backend: EmbeddingBackend, rate: float, start: float, copied: Counter,
+    created_before: Optional[str] = None, cancellable: bool = True,
+) -> Tuple[List[str], List[str]]:
+    """以 chunk_store 为准补齐 target：块数不一致的文档从 chunk_store 重新写入，已删除的文档从 target 删除
+
+    created_before 不为空时只补写此前创建的文档（切换后新上传的文档已直接写入 target）；
+    切换阶段以 cancellable=False 调用，保证切换前差异全部补齐。返回 (补写的文档, 删除的文档)。
+    """
+    client = get_milvus_client()
+    docs = {doc["doc_id"]: doc for doc in chunk_store.list_documents()}
+    stale, removed = diff_documents({doc_id: doc["chunk_count"] for doc_id, doc in docs.items()}, copied)
+    if created_before:
+        stale = [doc_id for doc_id in stale if docs[doc_id]["created_at"] < created_before]
+    _state["total"] += sum(docs[doc_id]["chunk_count"] for doc_id in stale)  # 仅为粗略进度
+    for doc_id in stale:
+        if cancellable and _cancel.is_set():
+            break
+        copied.pop(doc_id, None)
+        for batch in chunk_store.iter_chunks(doc_id, READ_BATCH):
+            rows = [{"id": c["id"], "doc_id": doc_id, "tag": docs[doc_id]["tag"]} for c in batch]
+            _write(target, rows, [c["content"] for c in batch], backend, rate, start, copied)
+    for i in range(0, len(removed), READ_BATCH):
+        expr = build_scope_filter(doc_ids=removed[i:i + READ_BATCH])
+        client.delete(collection_name=target, filter=expr)
+        client.delete(collection_name=document_collection_name(target), filter=expr)
+    for doc_id in removed:
+        copied.pop(doc_id, None)
+    return stale, removed
+
+
+def _verify_switch(target: str, dim: int):
+    """确认别名已指向 target，且通过别名检索可用"""
+    if resolve_collection() != target:
+        raise RuntimeError(f"别名 {settings.collection_name} 未指向 {target}")
+    get_milvus_client().search(
+        collection_name=settings.collection_name,
+        data=[probe_vector(dim)],
+        limit=1,
+        search_params={"metric_type": "COSINE", "params": {}},
+    )
+
+
+def _run(backend: EmbeddingBackend, rate: float):
+    client = get_milvus_client()
+    source = _state["source"]
+    model, dim = backend.model_name, backend.dim
+    target = new_collection_name(model, dim)
+    _state["target"] = target
+    start = time.perf_counter()
+    switched = False
+    try:
+        create_collection(target, dim, model, backend.kind)
+        _state["total"] = get_row_count()
+
+        # ① 全量复制：期间查询与写入仍由旧 collection 服务
+        copied: Counter = Counter()
+        _copy(source, target, backend, rate, start, copied)
+
+        # ② 不暂停写入，补齐复制期间新增/删除的文档（通常只剩很少的差异）
+        if not _cancel.is_set():
+            _state["status"] = "catching_up"
+            _catch_up(target, backend, rate, start, copied)
+            build_document_index(target)  # 按新模型的块向量重建文档级向量
+            client.load_collection(target)
+            client.load_collection(document_collection_name(target))
+
+        # ③ 暂停写入，补齐最后的差异后原子切换别名并校验；校验失败切回旧 collection。此后不再响应取消
+        _state["status"] = "switching"
+        if _cancel.is_set():
+            drop_collection(target)
+            _state.update(status="cancelled", finished_at=time.time())
+            return
+        if not pause_writes(settings.write_fence_timeout):
+            resume_writes()
+            raise RuntimeError("等待进行中的写入结束超时，未切换")
+        try:
+            time.sleep(settings.write_fence_grace)  # 其他进程中已开始的写入
+            stale, _ = _catch_up(target, backend, rate, start, copied, cancellable=False)
+            if stale:
+                build_document_index(target, stale)
+            client.flush(target)
+            previous = switch_alias(target)
+            try:
+                _verify_switch(target, dim)
+            except Exception:
+                switch_alias(previous)
+                raise
+            switched = True
+            switched_at = datetime.now().isoformat()
+        finally:
+            resume_writes()
+
+        # ④ 延迟删除旧 collection：等待其他进程刷新别名；删除前补写切换瞬间仍落入旧 collection 的文档
+        _state["status"] = "draining"
+        time.sleep(settings.migration_drop_delay)
+        stale, _ = _catch_up(
+            target, backend, rate, start, copied, created_before=switched_at, cancellable=False
+        )
+        if stale:
+            build_document_index(target, stale)
+        drop_collection(source)
+        _state.update(status="completed", finished_at=time.time())
+        logger.info(
+            "embedding 迁移完成：%s → %s（%s 后端 %s，%d 维），共 %d 块，%.1f 块/秒",
+            source, target, backend.kind, model, dim, _state["processed"], _state["throughput"],
+        )
+    except Exception as e:
+        logger.error("embedding 迁移失败: %s", e)
+        _state.update(status="failed", error=str(e), finished_at=time.time())
+        # 切换前失败：清理未完成的新 collection，服务继续使用旧 collection；切换后失败则两者都保留
+        if not switched:
+            drop_collection(target)
@@ -1,58 +1,359 @@
-from typing import List, Dict, Any, Optional
-from pymilvus import MilvusClient, DataType
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Optional, Set, Union
 from datetime import datetime
+import json
+import logging
+import os
+import re
+import threading
+import time
 
 from app.config import get_settings
+from app.services import chunk_store
+
+if TYPE_CHECKING:
+    import numpy as np
+    from pymilvus import MilvusClient
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 _client: Optional[MilvusClient] = None
+_tag_supported = True  # 旧版 collection 无 tag 字段时置为 False
+_text_in_milvus = False  # 旧版 collection 的文本与元数据保存在 Milvus 中（自增主键）
+_doc_collection: Optional[str] = None  # 当前实体 collection 对应的文档级向量 collection（两阶段检索第一阶段）
+TOMBSTONES_KEY = "tombstones"  # chunk_store meta：上次 compaction 以来删除的行数（delete 只写墓碑，compaction 后才回收）
+GENERATION_KEY = "alias_generation"  # chunk_store meta：别名每切换一次加一，各进程据此刷新当前 collection
+WRITE_FENCE_KEY = "write_fence_until"  # chunk_store meta：写入暂停的截止时间戳（切换别名期间）
+WRITE_FENCE_TTL = 600  # 暂停登记的最长有效期（秒），持有者异常退出时写入不会被永久阻塞
+MODEL_PROPERTY = "kb.embedding_model"  # collection 属性：写入该 collection 的向量所用的 embedding 模型
+BACKEND_PROPERTY = "kb.embedding_backend"  # collection 属性：该模型所用的 embedding 后端（zhipu / local）
+DOC_INDEX_BATCH = 256  # 构建文档级向量时每次查询的文档数（query_iterator 遍历这些文档的全部块，无数量上限）
+DOC_INDEX_QUERY_ROWS = 1000  # query_iterator 每批返回的块数
+_doc_index_builds: Dict[str, threading.Thread] = {}  # 本进程中正在后台构建文档级向量的实体 collection
+# 当前服务的实体 collection 及其 embedding 模型 / 维度（以 collection 自身记录为准，不写回 settings）
+_active: Dict[str, Any] = {}
+
+
+class WritesPausedError(RuntimeError):
+    """collection 切换期间写入暂停，或写入所用的 embedding 已随切换过期；稍后重试即可"""
+
+
+class _WriteGate:
+    """进程内写闸：写入共享进入；切换别名前关闭，阻止新的写入并等待进行中的写入结束"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._writers = 0
+        self._closed = False
+
+    @contextmanager
+    def write(self, timeout: float):
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self._closed, timeout):
+                raise WritesPausedError("正在切换知识库 collection，写入已暂停，请稍后重试")
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writers -= 1
+                self._cond.notify_all()
+
+    def close(self, timeout: float) -> bool:
+        with self._cond:
+            self._closed = True
+            return self._cond.wait_for(lambda: self._writers == 0, timeout)
+
+    def open(self):
+        with self._cond:
+            self._closed = False
+            self._cond.notify_all()
+
+
+_write_gate = _WriteGate()
 
 
 def get_milvus_client() -> MilvusClient:
     global _client
     if _client is None:
+        # pymilvus 导入较重（gRPC/protobuf），延迟到首次使用时再加载
+        from pymilvus import MilvusClient
         _client = MilvusClient(uri=settings.milvus_uri)
     return _client
 
 
-def _get_existing_dim(client: MilvusClient) -> int | None:
-    """获取已有 collection 的向量维度，不存在则返回 None"""
+def _describe(client: MilvusClient, name: Optional[str] = None) -> Dict[str, Any]:
     try:
-        desc = client.describe_collection(settings.collection_name)
-        for field in desc.get("fields", []):
-            if field.get("name") == "embedding":
-                return field.get("params", {}).get("dim")
+        return client.describe_collection(name or settings.collection_name)
     except Exception:
-        pass
+        return {}
+
+
+def _get_existing_fields(client: MilvusClient, name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """获取已有 collection 的字段描述（按字段名索引），失败返回空字典"""
+    desc = _describe(client, name)
+    return {field.get("name"): field for field in desc.get("fields", [])}
+
+
+def _get_existing_dim(client: MilvusClient, name: Optional[str] = None) -> int | None:
+    """获取已有 collection 的向量维度，不存在则返回 None"""
+    field = _get_existing_fields(client, name).get("embedding")
+    if field:
+        return field.get("params", {}).get("dim")
     return None
 
 
+def get_collection_embedding(name: Optional[str] = None) -> Dict[str, str] | None:
+    """读取 collection 属性中记录的 embedding 后端与模型：{"backend", "model"}（旧版 collection 未记录时返回 None）"""
+    properties = _describe(get_milvus_client(), name).get("properties") or {}
+    if MODEL_PROPERTY not in properties:
+        return None
+    return {
+        "backend": properties.get(BACKEND_PROPERTY) or "zhipu",
+        "model": properties[MODEL_PROPERTY],
+    }
+
+
+def _configured_embedding() -> Dict[str, str]:
+    """.env 中配置的 embedding 后端与模型（不加载模型）；只用于新建 collection 与未记录模型的旧版 collection"""
+    if settings.embedding_backend == "local":
+        return {"backend": "local", "model": settings.local_embedding_model}
+    return {"backend": settings.embedding_backend, "model": settings.embedding_model}
+
+
+def resolve_collection(name: Optional[str] = None) -> str:
+    """将别名解析为实际的 collection 名；不是别名时原样返回"""
+    name = name or settings.collection_name
+    try:
+        return get_milvus_client().describe_alias(name)["collection_name"]
+    except Exception:
+        return name
+
+
+# 旧版 collection 中保存文本与元数据的字段（现已移至 chunk_store）
+LEGACY_TEXT_FIELDS = ["doc_name", "doc_type", "content", "chunk_index", "created_at"]
+
+
+def _quote(value: str) -> str:
+    """转义字符串，用于拼接 Milvus 过滤表达式"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def build_scope_filter(
+    doc_id: Optional[str] = None,
+    doc_ids: Optional[List[str]] = None,
+    tag: Optional[str] = None,
+) -> str:
+    """根据检索范围构建过滤表达式，空字符串表示全库（启用分区键时，分区键字段上的过滤只扫描命中的分区）"""
+    ids = list(doc_ids or [])
+    if doc_id and doc_id not in ids:
+        ids.append(doc_id)
+
+    clauses = []
+    if len(ids) == 1:
+        clauses.append(f"doc_id == {_quote(ids[0])}")
+    elif ids:
+        clauses.append(f"doc_id in [{', '.join(_quote(i) for i in ids)}]")
+    if tag:
+        if not _tag_supported:
+            raise ValueError("当前 Collection 不支持按标签检索，请重建后再试")
+        clauses.append(f"tag == {_quote(tag)}")
+    return " and ".join(clauses)
+
+
+def new_collection_name(model: str, dim: int) -> str:
+    """新实体 collection 名：<别名>_<模型>_<维度>_<时间戳>（服务始终通过别名 settings.collection_name 访问）"""
+    suffix = re.sub(r"\W", "_", model)
+    return f"{settings.collection_name}_{suffix}_{dim}_{int(time.time())}"
+
+
 def init_collection():
-    """初始化 Milvus Collection（表结构）；若维度不匹配则自动重建"""
-    import logging
-    logger = logging.getLogger(__name__)
-    client = get_milvus_client()
+    """初始化 Milvus Collection（表结构）
+
+    settings.collection_name 是服务别名，指向实际的实体 collection；旧部署中同名的实体 collection
+    会被改名为 <name>_v0 并创建同名别名，数据原地保留。
+    当前使用的 embedding 后端、模型与维度以实体 collection 的记录为准（属性中的后端与模型、向量字段维度），
+    不写回 settings；蓝绿迁移切换别名后，各进程通过 chunk_store 中的切换代数感知并刷新。
+    配置与已有 collection 不一致时：collection 记录了模型则沿用并告警；未记录（旧版）且维度不符则拒绝启动以保护数据。
+    drop_collection_on_dim_change=True 时按配置新建实体 collection，切换别名后删除旧的。
+    """
+    from app.services.embedding_service import configured_backend
 
-    if client.has_collection(settings.collection_name):
+    client = get_milvus_client()
+    import_soft_delete_file()
+    alias = settings.collection_name
+    configured = _configured_embedding()
+
+    if not client.has_collection(alias):
+        backend = configured_backend()
+        physical = new_collection_name(backend.model_name, backend.dim)
+        create_collection(physical, backend.dim, backend.model_name, backend.kind)
+        mark_document_index_ready(physical)  # 空 collection，文档级向量随写入同步
+        client.create_alias(collection_name=physical, alias=alias)
+    else:
+        _adopt_legacy_collection(client)
         existing_dim = _get_existing_dim(client)
-        if existing_dim == settings.embedding_dim:
-            return  # 维度一致，直接复用
-        # 维度不一致（切换了 embedding 模型），删除旧 collection 重建
+        recorded = get_collection_embedding()
+        current = recorded or configured  # 旧版 collection 未记录模型，视为按当前配置写入
+        if settings.drop_collection_on_dim_change:
+            backend = configured_backend()
+            if current != configured or existing_dim != backend.dim:
+                logger.warning(
+                    "Collection（%s，%s 维）与配置 %s（%s 维）不符，删除旧数据并重建",
+                    current["model"], existing_dim, backend.model_name, backend.dim
+                )
+                _recreate_collection(client, backend)
+        elif recorded is None:
+            backend = configured_backend()
+            if existing_dim != backend.dim:
+                raise RuntimeError(
+                    f"Collection 向量维度 {existing_dim} 与配置 {backend.dim} 不符。"
+                    "为保护已有数据不会自动重建：请恢复原 EMBEDDING_MODEL/EMBEDDING_DIM 后"
+                    "通过 POST /api/admin/migration 迁移，或设置 DROP_COLLECTION_ON_DIM_CHANGE=true"
+                )
+        elif recorded != configured:
+            logger.warning(
+                "Collection 使用 %s 后端的 %s（%s 维），与配置的 %s 后端 %s 不符，沿用 collection 的模型；"
+                "请更新 .env 或通过 /api/admin/migration 迁移",
+                recorded["backend"], recorded["model"], existing_dim, configured["backend"], configured["model"]
+            )
+
+    _load_active(client)
+    if not _tag_supported:
         logger.warning(
-            "Collection 向量维度 %s 与配置 %s 不符，删除旧数据并重建",
-            existing_dim, settings.embedding_dim
+            "Collection 为旧版结构（无 tag 字段/分区键），按标签检索不可用；"
+            "如需启用请通过 /api/admin/migration 迁移到新 collection"
         )
-        client.drop_collection(settings.collection_name)
+    if _text_in_milvus:
+        _backfill_chunk_store(client)
+    _init_document_index(client)
+
+
+def _adopt_legacy_collection(client: MilvusClient):
+    """旧部署中 settings.collection_name 是实体 collection：改名为 <name>_v0 并创建同名别名
+
+    连同文档级向量 collection 一起改名，不删除、不复制数据；此后的切换均为 alter_alias 原子操作。
+    """
+    alias = settings.collection_name
+    if resolve_collection(alias) != alias:
+        return
+    legacy = f"{alias}_v0"
+    try:
+        client.rename_collection(old_name=alias, new_name=legacy)
+    except Exception:
+        if resolve_collection(alias) != alias:
+            return  # 多个进程同时启动，其他进程已完成改名
+        raise
+    if client.has_collection(document_collection_name(alias)):
+        client.rename_collection(
+            old_name=document_collection_name(alias), new_name=document_collection_name(legacy)
+        )
+    marker = chunk_store.get_meta(f"backfilled:{alias}")
+    if marker:
+        chunk_store.set_meta(f"backfilled:{legacy}", marker)
+    client.create_alias(collection_name=legacy, alias=alias)
+    logger.info("旧版 collection %s 已改名为 %s，并创建同名别名", alias, legacy)
+
+
+def _recreate_collection(client: MilvusClient, backend: Any):
+    """按配置的后端新建空的实体 collection 并切换别名，再删除旧 collection 及全部块文本"""
+    previous = resolve_collection()
+    physical = new_collection_name(backend.model_name, backend.dim)
+    create_collection(physical, backend.dim, backend.model_name, backend.kind)
+    mark_document_index_ready(physical)
+    switch_alias(physical)
+    drop_collection(previous)
+    chunk_store.delete_documents(sorted(chunk_store.get_all_document_ids()))
+
+
+def _load_active(client: Optional[MilvusClient] = None):
+    """从别名指向的实体 collection 读取结构、embedding 模型与维度"""
+    global _active, _tag_supported, _text_in_milvus, _doc_collection
+    client = client or get_milvus_client()
+    generation = chunk_store.get_meta(GENERATION_KEY)
+    physical = resolve_collection()
+    fields = _get_existing_fields(client, physical)
+    _tag_supported = "tag" in fields
+    _text_in_milvus = "content" in fields
+    docs = document_collection_name(physical)
+    _doc_collection = docs if client.has_collection(docs) else None
+    embedding = get_collection_embedding(physical) or _configured_embedding()
+    _active = {
+        "collection": physical,
+        "backend": embedding["backend"],
+        "model": embedding["model"],
+        "dim": int(fields["embedding"]["params"]["dim"]),
+        "generation": generation,
+        "doc_index_ready": is_document_index_ready(physical),
+    }
+
+
+def _refresh_active():
+    """别名被切换（本进程或其他进程）后重新读取当前 collection 信息；每次只多一次 chunk_store 主键查询"""
+    if not _active or chunk_store.get_meta(GENERATION_KEY) != _active["generation"]:
+        _load_active()
 
-    schema = MilvusClient.create_schema(auto_id=True, enable_dynamic_field=False)
+
+def get_active_embedding() -> Dict[str, Any]:
+    """当前服务 collection 使用的 embedding：{"backend", "model", "dim"}；查询与入库都应按此向量化"""
+    _refresh_active()
+    return {"backend": _active["backend"], "model": _active["model"], "dim": _active["dim"]}
+
+
+def _backfill_chunk_store(client: MilvusClient):
+    """旧版 collection 的文本保存在 Milvus 中：按原主键一次性导入 chunk_store，之后读取只走 chunk_store
+
+    每个实体 collection 只导入一次（记录在 chunk_store 的 meta 表中）。
+    """
+    physical = resolve_collection()
+    key = f"backfilled:{physical}"
+    if chunk_store.get_meta(key):
+        return
+    fields = ["doc_id"] + LEGACY_TEXT_FIELDS + (["tag"] if _tag_supported else [])
+    iterator = client.query_iterator(
+        collection_name=physical,
+        filter='doc_id != ""',
+        output_fields=fields,
+        batch_size=1000,
+    )
+    total = 0
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            total += chunk_store.put_chunks(batch, ignore_existing=True)
+    finally:
+        iterator.close()
+    chunk_store.set_meta(key, str(total))
+    logger.info("已将旧版 collection %s 的 %d 个文本块导入 chunk_store", physical, total)
+
+
+def create_collection(name: str, dim: int, model: str, backend: str):
+    """按当前表结构创建 collection，并在 collection 属性中记录 embedding 后端与模型
+
+    Milvus 中只保存块 id（由 chunk_store 分配，作为主键）、doc_id、tag 与向量，
+    文本及文档元数据存放在 chunk_store 中。
+    """
+    from pymilvus import MilvusClient, DataType
+
+    partition_key = settings.partition_key_field
+    schema_kwargs: Dict[str, Any] = {
+        "auto_id": False,
+        "enable_dynamic_field": False,
+    }
+    if partition_key:
+        # 分区键：doc_id / tag 上的过滤只会扫描对应分区
+        schema_kwargs["partition_key_field"] = partition_key
+        schema_kwargs["num_partitions"] = settings.num_partitions
+
+    schema = MilvusClient.create_schema(**schema_kwargs)
     schema.add_field("id", DataType.INT64, is_primary=True)
     schema.add_field("doc_id", DataType.VARCHAR, max_length=64)
-    schema.add_field("doc_name", DataType.VARCHAR, max_length=512)
-    schema.add_field("doc_type", DataType.VARCHAR, max_length=32)
-    schema.add_field("content", DataType.VARCHAR, max_length=4096)
-    schema.add_field("chunk_index", DataType.INT64)
-    schema.add_field("created_at", DataType.VARCHAR, max_length=32)
-    schema.add_field("embedding", DataType.FLOAT_VECTOR, dim=settings.embedding_dim)
+    schema.add_field("tag", DataType.VARCHAR, max_length=64)
+    schema.add_field("embedding", DataType.FLOAT_VECTOR, dim=dim)
 
     index_params = MilvusClient.prepare_index_params()
     index_params.add_index(
@@ -61,191 +362,614 @@ def init_collection():
         metric_type="COSINE",
     )
 
+    client = get_milvus_client()
     client.create_collection(
-        collection_name=settings.collection_name,
+        collection_name=name,
+        schema=schema,
+        index_params=index_params,
+        properties={MODEL_PROPERTY: model, BACKEND_PROPERTY: backend},
+    )
+    create_document_collection(document_collection_name(name), dim)
+
+
+def document_collection_name(collection: str) -> str:
+    """文档级向量 collection 名，与块向量实体 collection 一一对应（随别名切换一起切换）"""
+    return f"{collection}_docs"
+
+
+def create_document_collection(name: str, dim: int):
+    """文档级向量 collection：每个文档一行（doc_id 为主键），向量为该文档块向量的均值方向"""
+    from pymilvus import MilvusClient, DataType
+
+    schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=False)
+    schema.add_field("doc_id", DataType.VARCHAR, max_length=64, is_primary=True)
+    schema.add_field("tag", DataType.VARCHAR, max_length=64)
+    schema.add_field("embedding", DataType.FLOAT_VECTOR, dim=dim)
+
+    index_params = MilvusClient.prepare_index_params()
+    index_params.add_index(
+        field_name="embedding",
+        index_type="AUTOINDEX",
+        metric_type="COSINE",
+    )
+    get_milvus_client().create_collection(
+        collection_name=name,
         schema=schema,
         index_params=index_params
     )
 
 
+def _doc_index_key(collection: str) -> str:
+    return f"doc_index_ready:{collection}"
+
+
+def is_document_index_ready(collection: Optional[str] = None) -> bool:
+    """实体 collection 的文档级向量是否已完整构建（chunk_store meta 中的标记，多进程共享）"""
+    return bool(chunk_store.get_meta(_doc_index_key(resolve_collection(collection))))
+
+
+def mark_document_index_ready(collection: str):
+    """标记文档级向量已完整：新建的空 collection，或全量构建完成后调用"""
+    chunk_store.set_meta(_doc_index_key(collection), datetime.now().isoformat())
+
+
+def _init_document_index(client: MilvusClient):
+    """确保当前实体 collection 有对应的文档级向量 collection；未完整构建时（旧版 collection、构建中断）后台补建
+
+    补建期间新写入与删除照常同步到文档级 collection，检索退化为单阶段，完成并标记后自动启用两阶段检索。
+    """
+    global _doc_collection
+    physical = resolve_collection()
+    name = document_collection_name(physical)
+    if not client.has_collection(name):
+        create_document_collection(name, _active["dim"])
+    _doc_collection = name
+    if not is_document_index_ready(physical):
+        start_document_index_build(physical)
+
+
+def start_document_index_build(collection: str):
+    """在后台线程中全量构建 collection 的文档级向量，完成后写入就绪标记；本进程内同一 collection 只构建一次"""
+    existing = _doc_index_builds.get(collection)
+    if existing is not None and existing.is_alive():
+        return
+
+    def run():
+        try:
+            t0 = time.perf_counter()
+            count = build_document_index(collection)
+            logger.info(
+                "已为 collection %s 补建文档级向量：%d 个文档，耗时 %.1fs", collection, count, time.perf_counter() - t0
+            )
+        except Exception as e:
+            logger.error("补建 collection %s 的文档级向量失败: %s", collection, e)
+
+    thread = threading.Thread(target=run, name=f"doc-index-{collection}", daemon=True)
+    _doc_index_builds[collection] = thread
+    thread.start()
+
+
+def _document_index_ready() -> bool:
+    """两阶段检索是否可用：未就绪时重新读取标记（其他进程或后台线程可能已完成构建）"""
+    if not _active.get("doc_index_ready"):
+        _active["doc_index_ready"] = is_document_index_ready(_active["collection"])
+    return _active["doc_index_ready"]
+
+
+def _unit_rows(vectors: Any) -> np.ndarray:
+    """逐行归一化（文档级向量为各块单位向量之和再归一化，即余弦度量下块向量的平均方向）"""
+    import numpy as np
+    arr = np.asarray(vectors, dtype=np.float32)
+    return arr / np.maximum(np.linalg.norm(arr, axis=1, keepdims=True), 1e-12)
+
+
+def _normalize(vector: np.ndarray) -> List[float]:
+    import numpy as np
+    return (vector / max(float(np.linalg.norm(vector)), 1e-12)).tolist()
+
+
+def build_document_index(collection: Optional[str] = None, doc_ids: Optional[List[str]] = None) -> int:
+    """按块向量重新计算文档级向量并写入对应的文档级 collection，返回写入的文档数
+
+    用于旧版 collection 补建、迁移目标与快照导入。每 DOC_INDEX_BATCH 个文档用一个 query_iterator
+    遍历其全部块（doc_id 为分区键时只扫描对应分区），边读边累加各文档归一化块向量之和，
+    文档块数不受单次查询上限限制，内存只保留一批块与这批文档的累加向量。
+    chunk_store 中已不存在的文档（构建期间被删除）不写入，写入后再核对一次并删除期间消失的文档。
+    doc_ids 为空时构建全部文档，完成后写入就绪标记。
+    """
+    client = get_milvus_client()
+    collection = resolve_collection(collection)
+    target = document_collection_name(collection)
+    ids = sorted(chunk_store.get_all_document_ids() if doc_ids is None else doc_ids)
+    count = 0
+    for start in range(0, len(ids), DOC_INDEX_BATCH):
+        batch = ids[start:start + DOC_INDEX_BATCH]
+        sums: Dict[str, np.ndarray] = {}
+        iterator = client.query_iterator(
+            collection_name=collection,
+            filter=build_scope_filter(doc_ids=batch),
+            output_fields=["doc_id", "embedding"],
+            batch_size=DOC_INDEX_QUERY_ROWS,
+        )
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                vectors = _unit_rows([r["embedding"] for r in rows])
+                for row, vector in zip(rows, vectors):
+                    if row["doc_id"] in sums:
+                        sums[row["doc_id"]] += vector
+                    else:
+                        sums[row["doc_id"]] = vector.copy()
+        finally:
+            iterator.close()
+        documents = [(doc_id, chunk_store.get_document(doc_id)) for doc_id in sums]
+        documents = [(doc_id, meta) for doc_id, meta in documents if meta is not None]
+        if not documents:
+            continue
+        client.upsert(collection_name=target, data=[
+            {"doc_id": doc_id, "tag": meta["tag"], "embedding": _normalize(sums[doc_id])}
+            for doc_id, meta in documents
+        ])
+        # 删除文档时先清 chunk_store 再清文档级向量：此时仍在的文档若随后被删除，其文档级向量会在之后被清理
+        written = [doc_id for doc_id, _ in documents]
+        gone = sorted(set(written) - set(chunk_store.find_document_ids(written)))
+        if gone:
+            client.delete(collection_name=target, filter=build_scope_filter(doc_ids=gone))
+        count += len(written) - len(gone)
+    if doc_ids is None:
+        mark_document_index_ready(collection)
+    return count
+
+
+def switch_alias(target: str) -> str:
+    """将服务别名 settings.collection_name 原子切换到 target collection（alter_alias）
+
+    切换后递增 chunk_store 中的切换代数，所有进程在下一次读写时刷新当前 collection 与 embedding 信息。
+    返回切换前的实体 collection 名。
+    """
+    client = get_milvus_client()
+    _adopt_legacy_collection(client)
+    previous = resolve_collection()
+    client.alter_alias(collection_name=target, alias=settings.collection_name)
+    chunk_store.add_meta_int(GENERATION_KEY, 1)
+    _load_active(client)
+    return previous
+
+
+def drop_collection(name: str):
+    """删除实体 collection 及其文档级向量 collection（不存在的跳过）"""
+    client = get_milvus_client()
+    for collection in (name, document_collection_name(name)):
+        if client.has_collection(collection):
+            client.drop_collection(collection)
+
+
+def pause_writes(timeout: float) -> bool:
+    """暂停写入（切换别名前）：关闭本进程写闸并等待进行中的写入结束，最长 timeout 秒
+
+    同时在 chunk_store 中登记暂停截止时间，其他进程的写入在开始前检查并等待。
+    """
+    chunk_store.set_meta(WRITE_FENCE_KEY, str(time.time() + WRITE_FENCE_TTL))
+    return _write_gate.close(timeout)
+
+
+def resume_writes():
+    chunk_store.set_meta(WRITE_FENCE_KEY, "0")
+    _write_gate.open()
+
+
+@contextmanager
+def _writing():
+    """写入 Milvus 前进入写闸；其他进程正在切换别名时等待，超过 write_fence_timeout 抛出 WritesPausedError"""
+    timeout = settings.write_fence_timeout
+    with _write_gate.write(timeout):
+        deadline = time.monotonic() + timeout
+        while float(chunk_store.get_meta(WRITE_FENCE_KEY) or 0) > time.time():
+            if time.monotonic() > deadline:
+                raise WritesPausedError("正在切换知识库 collection，写入已暂停，请稍后重试")
+            time.sleep(0.2)
+        _refresh_active()
+        yield
+
+
+def load_collection():
+    """将 Collection 加载到内存，避免首次检索时才触发加载"""
+    client = get_milvus_client()
+    client.load_collection(resolve_collection())
+    if _doc_collection:
+        client.load_collection(_doc_collection)
+
+
+def probe_vector(dim: Optional[int] = None) -> List[float]:
+    """单位探测向量（第一维为 1），用于预热、迁移校验与延迟探测；dim 默认取当前 collection 的维度"""
+    probe = [0.0] * (dim or get_active_embedding()["dim"])
+    probe[0] = 1.0
+    return probe
+
+
+def _to_list(vectors: Any) -> List:
+    """ndarray → Python 列表（Milvus 边界处转换）；已是列表时原样返回"""
+    return vectors.tolist() if hasattr(vectors, "tolist") else vectors
+
+
+def insert_chunk_rows(
+    rows: List[Dict[str, Any]],
+    embeddings: Union[np.ndarray, List[List[float]]],
+    store_text: bool = True
+) -> List[int]:
+    """写入一批块：Milvus 写入 id / doc_id / tag / 向量，文本与文档元数据写入 chunk_store，返回块 id
+
+    rows 需包含 doc_id、chunk_index、content、doc_name、doc_type、tag、created_at，
+    可带 id（如快照导入），否则由 chunk_store 分配。旧版 collection（自增主键）仍在 Milvus 中写入
+    文本字段（content 受 VARCHAR 长度限制截断），块 id 取 Milvus 返回的主键。
+    store_text=False 时只写 Milvus（快照导入且 chunk_store 已有相同的块），rows 只需 id、doc_id、tag。
+    """
+    client = get_milvus_client()
+    _refresh_active()
+    vectors = _to_list(embeddings)
+    if _text_in_milvus:
+        data = [
+            {
+                **{f: row[f] for f in LEGACY_TEXT_FIELDS},
+                "content": row["content"][:4000],
+                "doc_id": row["doc_id"],
+                "embedding": embedding,
+            }
+            for row, embedding in zip(rows, vectors)
+        ]
+    else:
+        new_ids = iter(chunk_store.allocate_ids(sum(1 for row in rows if row.get("id") is None)))
+        data = [
+            {
+                "id": row["id"] if row.get("id") is not None else next(new_ids),
+                "doc_id": row["doc_id"],
+                "embedding": embedding,
+            }
+            for row, embedding in zip(rows, vectors)
+        ]
+    if _tag_supported:
+        for item, row in zip(data, rows):
+            item["tag"] = row.get("tag", "")
+
+    result = client.insert(collection_name=_active["collection"], data=data)
+    ids = [int(i) for i in result["ids"]]
+    del vectors, data  # 释放本批列表，避免与下一批转换结果同时驻留
+    # 向量写入后再写文本：检索命中尚未写入 chunk_store 的块时直接跳过
+    if store_text:
+        chunk_store.put_chunks({**row, "id": chunk_id} for row, chunk_id in zip(rows, ids))
+    return ids
+
+
 def insert_chunks(
     doc_id: str,
     doc_name: str,
     doc_type: str,
     chunks: List[str],
-    embeddings: List[List[float]]
+    embeddings: Union[np.ndarray, List[List[float]]],
+    tag: str = "",
+    embedding_model: Optional[str] = None
+) -> int:
+    """插入文档块及其向量，tag 用于按租户/分组限定检索范围
+
+    embeddings 为 (n, dim) 的 float32 数组时，按 insert_batch_size 分批转换为列表再写入，
+    同一时刻只有一批向量以 Python float 形式存在。块文本完整保存在 chunk_store 中，不再截断。
+    embedding_model 为向量化所用模型：向量化期间别名已切换到其他模型时抛出 WritesPausedError，由调用方重试。
+    任一批写入失败时按 doc_id 删除已写入的向量、文档级向量与文本后重新抛出，不留下半个文档。
+    """
+    with _writing():
+        if (embedding_model and embedding_model != _active["model"]) or (
+            len(chunks) and len(embeddings[0]) != _active["dim"]
+        ):
+            raise WritesPausedError("知识库已切换到新的 embedding 模型，请重新上传")
+        try:
+            return _insert_chunks(doc_id, doc_name, doc_type, chunks, embeddings, tag)
+        except Exception:
+            try:
+                _delete_documents([doc_id])
+            except Exception as e:
+                logger.error("回滚文档 %s 的部分写入失败: %s", doc_id, e)
+            raise
+
+
+def _insert_chunks(
+    doc_id: str,
+    doc_name: str,
+    doc_type: str,
+    chunks: List[str],
+    embeddings: Union[np.ndarray, List[List[float]]],
+    tag: str
 ) -> int:
-    """插入文档块及其向量"""
-    client = get_milvus_client()
     now = datetime.now().isoformat()
+    batch_size = settings.insert_batch_size
+    inserted = 0
+    direction: Optional[np.ndarray] = None  # 各块单位向量之和，按批累加，不另外复制整篇文档的向量
+
+    for start in range(0, len(chunks), batch_size):
+        rows = [
+            {
+                "doc_id": doc_id,
+                "doc_name": doc_name,
+                "doc_type": doc_type,
+                "tag": tag,
+                "content": chunk,
+                "chunk_index": start + i,
+                "created_at": now,
+            }
+            for i, chunk in enumerate(chunks[start:start + batch_size])
+        ]
+        batch = embeddings[start:start + batch_size]
+        inserted += len(insert_chunk_rows(rows, batch))
+        if _doc_collection:
+            unit_sum = _unit_rows(batch).sum(axis=0)
+            direction = unit_sum if direction is None else direction + unit_sum
+
+    if _doc_collection and direction is not None:
+        get_milvus_client().upsert(
+            collection_name=_doc_collection,
+            data=[{"doc_id": doc_id, "tag": tag, "embedding": _normalize(direction)}],
+        )
+    return inserted
 
-    data = [
-        {
-            "doc_id": doc_id,
-            "doc_name": doc_name,
-            "doc_type": doc_type,
-            "content": chunk[:4000],
-            "chunk_index": i,
-            "created_at": now,
-            "embedding": embedding
-        }
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
-    ]
 
-    result = client.insert(collection_name=settings.collection_name, data=data)
-    return result["insert_count"]
+def _hidden_filter() -> str:
+    hidden = get_soft_deleted_ids()
+    if not hidden:
+        return ""
+    return f"doc_id not in [{', '.join(_quote(i) for i in sorted(hidden))}]"
+
+
+def search_documents(
+    query: List[float],
+    top_n: int,
+    tag: Optional[str] = None
+) -> List[str]:
+    """在文档级向量中检索最相关的 top_n 个文档（两阶段检索的第一阶段），返回 doc_id 列表"""
+    clauses = [c for c in (f"tag == {_quote(tag)}" if tag else "", _hidden_filter()) if c]
+    search_kwargs: Dict[str, Any] = {
+        "collection_name": _doc_collection,
+        "data": [query],
+        "limit": top_n,
+        "output_fields": ["doc_id"],
+        "search_params": {"metric_type": "COSINE", "params": {}}
+    }
+    if clauses:
+        search_kwargs["filter"] = " and ".join(clauses)
+    results = get_milvus_client().search(**search_kwargs)
+    # 文档级 collection 的主键是 doc_id，命中结果中没有 "id"
+    return [hit["entity"]["doc_id"] for hit in results[0]]
 
 
 def search_similar(
-    query_embedding: List[float],
+    query_embedding: Union[np.ndarray, List[float]],
     top_k: int = 5,
-    doc_id: Optional[str] = None
+    doc_id: Optional[str] = None,
+    doc_ids: Optional[List[str]] = None,
+    tag: Optional[str] = None
 ) -> List[Dict[str, Any]]:
-    """向量相似性搜索，doc_id 不为 None 时只在该文档内检索"""
+    """向量相似性搜索，可按 doc_id / doc_ids / tag 限定检索范围，均为空时检索全库
+
+    未限定文档且 coarse_top_docs > 0 时为两阶段检索：先在文档级向量中选出最相关的
+    coarse_top_docs 个文档，再只在这些文档的块中检索（doc_id 为分区键时只扫描命中的分区）。
+    Milvus 只返回块 id 与得分，命中块的文本按 id 从 chunk_store 批量读取。
+    """
     client = get_milvus_client()
+    _refresh_active()
+    query = _to_list(query_embedding)
+
+    if not (doc_id or doc_ids) and settings.coarse_top_docs > 0 and _doc_collection and _document_index_ready():
+        doc_ids = search_documents(query, settings.coarse_top_docs, tag)
+        if not doc_ids:
+            return []
 
     search_kwargs: Dict[str, Any] = {
         "collection_name": settings.collection_name,
-        "data": [query_embedding],
+        "data": [query],
         "limit": top_k,
-        "output_fields": ["doc_id", "doc_name", "content", "chunk_index"],
+        "output_fields": ["doc_id"],
         "search_params": {"metric_type": "COSINE", "params": {}}
     }
-    if doc_id:
-        search_kwargs["filter"] = f'doc_id == "{doc_id}"'
+    scope_filter = build_scope_filter(doc_id, doc_ids, tag)
+    hidden_expr = _hidden_filter()
+    if hidden_expr:
+        scope_filter = f"({scope_filter}) and {hidden_expr}" if scope_filter else hidden_expr
+    if scope_filter:
+        search_kwargs["filter"] = scope_filter
 
     results = client.search(**search_kwargs)
 
+    chunks = chunk_store.get_chunks([hit["id"] for hit in results[0]])
     hits = []
     for hit in results[0]:
+        chunk = chunks.get(hit["id"])
+        if chunk is None:
+            continue
         hits.append({
+            "id": hit["id"],
             "doc_id": hit["entity"]["doc_id"],
-            "doc_name": hit["entity"]["doc_name"],
-            "content": hit["entity"]["content"],
-            "chunk_index": hit["entity"]["chunk_index"],
+            "doc_name": chunk["doc_name"],
+            "content": chunk["content"],
+            "chunk_index": chunk["chunk_index"],
             "score": hit["distance"]
         })
     return hits
 
 
-def list_documents() -> List[Dict[str, Any]]:
-    """获取所有文档列表（去重），避免逐文档 N+1 查询
-
-    实现思路：
-    1. 先查询 chunk_index == 0 的记录，拿到每个文档的基础信息（1 条/文档）
-    2. 再用 doc_id in [...] 一次性查询所有文档的 chunk_index，统计 chunk 数量
-    """
-    client = get_milvus_client()
-    try:
-        # 步骤 1：每个文档一条“头块”记录
-        headers = client.query(
-            collection_name=settings.collection_name,
-            filter="chunk_index == 0",
-            output_fields=["doc_id", "doc_name", "doc_type", "created_at"],
-            limit=1000
-        )
-    except Exception:
-        return []
-
-    if not headers:
-        return []
+def is_tag_supported() -> bool:
+    """当前 Collection 是否包含 tag 字段（旧版结构没有）"""
+    return _tag_supported
 
-    # 所有文档 ID 列表
-    doc_ids = [h["doc_id"] for h in headers]
 
-    # 步骤 2：一次性查询所有相关文档的 chunk_index，并在内存中聚合统计
-    # 表达式示例：doc_id in ["id1", "id2", ...]
-    id_list_expr = ", ".join(f'"{doc_id}"' for doc_id in doc_ids)
-    try:
-        # Milvus 对 limit 有上限（通常为 16384），这里取一个安全上限
-        chunks = client.query(
-            collection_name=settings.collection_name,
-            filter=f"doc_id in [{id_list_expr}]",
-            output_fields=["doc_id", "chunk_index"],
-            limit=16_384,
-        )
-    except Exception:
-        # 如果统计失败，至少返回基础文档信息（chunk_count 退化为 1）
-        return [
-            {
-                "doc_id": h["doc_id"],
-                "doc_name": h["doc_name"],
-                "doc_type": h.get("doc_type", "unknown"),
-                "chunk_count": 1,
-                "created_at": h.get("created_at", ""),
-            }
-            for h in headers
-        ]
+def is_text_in_milvus() -> bool:
+    """当前 Collection 是否为文本保存在 Milvus 中的旧版结构（自增主键）"""
+    _refresh_active()
+    return _text_in_milvus
 
-    # 统计每个文档的块数量
-    counts: Dict[str, int] = {}
-    for item in chunks:
-        did = item.get("doc_id")
-        if not did:
-            continue
-        counts[did] = counts.get(did, 0) + 1
 
-    docs: List[Dict[str, Any]] = []
-    for h in headers:
-        did = h["doc_id"]
-        docs.append(
-            {
-                "doc_id": did,
-                "doc_name": h["doc_name"],
-                "doc_type": h.get("doc_type", "unknown"),
-                "chunk_count": counts.get(did, 0),
-                "created_at": h.get("created_at", ""),
-            }
-        )
-    return docs
+def list_documents() -> List[Dict[str, Any]]:
+    """获取所有文档列表（元数据与块数来自 chunk_store，不查询 Milvus）"""
+    return [
+        {
+            "doc_id": doc["doc_id"],
+            "doc_name": doc["doc_name"],
+            "doc_type": doc["doc_type"] or "unknown",
+            "chunk_count": doc["chunk_count"],
+            "created_at": doc["created_at"],
+            "tag": doc["tag"],
+        }
+        for doc in chunk_store.list_documents(exclude=get_soft_deleted_ids())
+    ]
 
 
 def get_document_meta(doc_id: str) -> Dict[str, Any] | None:
     """获取单个文档的基础元信息（主要用于根据 doc_id 查 doc_name）"""
-    client = get_milvus_client()
-    try:
-        results = client.query(
-            collection_name=settings.collection_name,
-            filter=f'doc_id == "{doc_id}" and chunk_index == 0',
-            output_fields=["doc_id", "doc_name", "doc_type", "created_at"],
-            limit=1,
-        )
-    except Exception:
-        return None
-
-    if not results:
-        return None
-    return results[0]
+    return chunk_store.get_document(doc_id)
 
 
 def delete_document(doc_id: str) -> bool:
     """删除指定文档的所有块"""
-    client = get_milvus_client()
-    client.delete(
-        collection_name=settings.collection_name,
-        filter=f'doc_id == "{doc_id}"'
-    )
+    delete_documents([doc_id])
     return True
 
 
-def document_exists(doc_id: str) -> bool:
+def delete_documents(doc_ids: List[str]) -> int:
+    """按 doc_id 列表一次性删除向量与文本，并清除软删除记录，返回 Milvus 删除行数"""
+    with _writing():
+        return _delete_documents(doc_ids)
+
+
+def _delete_documents(doc_ids: List[str]) -> int:
+    expr = f"doc_id in [{', '.join(_quote(i) for i in doc_ids)}]"
+    count = delete_by_filter(expr)
+    chunk_store.delete_documents(doc_ids)  # 同一事务内清除软删除登记
+    # 文档级向量最后删除：与后台构建（写入后按 chunk_store 核对）交错时也不会留下已删除文档的行
+    if _doc_collection:
+        get_milvus_client().delete(collection_name=_doc_collection, filter=expr)
+    return count
+
+
+def delete_by_filter(expr: str) -> int:
+    """按过滤表达式一次性批量删除，返回删除行数并计入墓碑数"""
     client = get_milvus_client()
-    results = client.query(
-        collection_name=settings.collection_name,
-        filter=f'doc_id == "{doc_id}"',
-        output_fields=["doc_id"],
-        limit=1
+    result = client.delete(collection_name=settings.collection_name, filter=expr)
+    count = result.get("delete_count", 0) if isinstance(result, dict) else len(result or [])
+    if count:
+        chunk_store.add_meta_int(TOMBSTONES_KEY, count)
+    return count
+
+
+def find_document_ids(
+    doc_ids: Optional[List[str]] = None,
+    name_pattern: Optional[str] = None,
+    created_before: Optional[str] = None,
+) -> List[str]:
+    """按条件查找文档 ID，多个条件之间为 and；全部为空时抛出 ValueError
+
+    name_pattern 中只有 % 是通配符（_ 按字面匹配），created_before 为 ISO 时间字符串。
+    """
+    return chunk_store.find_document_ids(doc_ids, name_pattern, created_before)
+
+
+def get_tombstone_count() -> int:
+    """上次 compaction 以来删除的行数（持久化在 chunk_store，重启与多进程间一致）"""
+    return int(chunk_store.get_meta(TOMBSTONES_KEY) or 0)
+
+
+def get_row_count() -> int:
+    """当前存活的实体行数
+
+    get_collection_stats 的 row_count 在 compaction 前仍包含已删除的行，这里用 count(*) 统计存活行。
+    """
+    result = get_milvus_client().query(
+        collection_name=resolve_collection(), filter="", output_fields=["count(*)"],
+        consistency_level="Strong",
     )
-    return len(results) > 0
+    return int(result[0]["count(*)"]) if result else 0
+
+
+def import_soft_delete_file():
+    """将旧版 JSON 文件中的软删除登记导入 chunk_store（导入后文件改名保留，只执行一次）"""
+    path = settings.soft_delete_file
+    if not path or not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        ids = json.load(f)
+    added = chunk_store.add_soft_deleted(ids)
+    os.replace(path, f"{path}.imported")
+    logger.info("已将 %d 条软删除记录从 %s 导入 chunk_store", added, path)
+
+
+def get_soft_deleted_ids() -> Set[str]:
+    """返回软删除的 doc_id 集合（每次从 chunk_store 读取，多进程间一致）"""
+    return chunk_store.get_soft_deleted()
+
+
+def soft_delete_documents(doc_ids: List[str]) -> int:
+    """软删除：检索与列表中立即隐藏，数据保留到下次 purge"""
+    chunk_store.add_soft_deleted(doc_ids, datetime.now().isoformat())
+    return len(doc_ids)
+
+
+def restore_documents(doc_ids: List[str]) -> int:
+    """撤销软删除，返回实际恢复的文档数"""
+    return chunk_store.remove_soft_deleted(doc_ids)
+
+
+def purge_soft_deleted() -> int:
+    """物理删除所有软删除的文档（单个批量表达式），返回删除行数"""
+    ids = sorted(get_soft_deleted_ids())
+    if not ids:
+        return 0
+    return delete_documents(ids)
+
+
+def compact_collection(timeout: float = 600) -> int:
+    """触发 compaction 回收墓碑并等待完成（最长 timeout 秒），返回 compaction 任务 ID"""
+    client = get_milvus_client()
+    # 只扣除发起时已记录的墓碑，compaction 期间新产生的删除留到下一轮
+    tombstones = get_tombstone_count()
+    job_id = client.compact(resolve_collection())
+    deadline = time.monotonic() + timeout
+    while client.get_compaction_state(job_id) not in ("Completed", "UndefiedState"):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"compaction {job_id} 超时未完成")
+        time.sleep(1)
+    chunk_store.add_meta_int(TOMBSTONES_KEY, -tombstones)
+    return job_id
+
+
+def document_exists(doc_id: str, include_soft_deleted: bool = False) -> bool:
+    if not include_soft_deleted and doc_id in get_soft_deleted_ids():
+        return False
+    return chunk_store.get_document(doc_id) is not None
+
+
+def count_document_chunks(doc_id: str) -> int:
+    """统计指定文档的块数量"""
+    return chunk_store.count_chunks(doc_id)
+
+
+def get_document_chunks_page(
+    doc_id: str,
+    after: int = -1,
+    limit: int = 100
+) -> List[Dict[str, Any]]:
+    """按 chunk_index 游标分页获取文本块：返回 chunk_index 大于 after 的前 limit 块，升序排列
+
+    每页是一次独立的有界查询，调用方以本页最后一块的 chunk_index 作为下一页游标。
+    """
+    return chunk_store.get_chunks_after(doc_id, after, limit)
+
+
+def iter_document_chunks(doc_id: str, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+    """按 chunk_index 升序分批遍历文档的全部文本块，每批最多 batch_size 条"""
+    yield from chunk_store.iter_chunks(doc_id, batch_size)
 
 
 def get_document_chunks(doc_id: str) -> List[Dict[str, Any]]:
     """获取指定文档的全部文本块，按 chunk_index 升序排列"""
-    client = get_milvus_client()
-    results = client.query(
-        collection_name=settings.collection_name,
-        filter=f'doc_id == "{doc_id}"',
-        output_fields=["doc_id", "doc_name", "doc_type", "content", "chunk_index"],
-        limit=10000
-    )
-    return sorted(results, key=lambda x: x.get("chunk_index", 0))
+    chunks: List[Dict[str, Any]] = []
+    for batch in iter_document_chunks(doc_id):
+        chunks.extend(batch)
+    return chunks
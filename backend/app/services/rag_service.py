@@ -1,11 +1,14 @@
 import asyncio
-import json
-from typing import List, AsyncGenerator, Optional
-from zhipuai import ZhipuAI
+import threading
+from typing import Callable, Dict, List, AsyncGenerator, Optional, Set
 
 from app.config import get_settings
-from app.services.embedding_service import get_embedding
+from app.services import chunk_store
+from app.services.embedding_service import get_client, get_embedding
 from app.services.milvus_service import search_similar
+from app.services import admission_service as admission
+from app.services.admission_service import Priority
+from app.utils.sse import coalesce_deltas, encode_event
 
 settings = get_settings()
 
@@ -15,14 +18,33 @@ def _build_context(search_results: List[dict]) -> str:
         return ""
     parts = []
     for i, result in enumerate(search_results, 1):
-        parts.append(
-            f"[来源{i}] 文档：《{result['doc_name']}》\n{result['content']}"
-        )
+        text = result["context"] if "context" in result else result["content"]
+        if not text:
+            continue  # 已完整包含在前面来源的相邻块中
+        parts.append(f"[来源{i}] 文档：《{result['doc_name']}》\n{text}")
     return "\n\n---\n\n".join(parts)
 
 
-def _build_system_prompt(context: str, doc_name: Optional[str] = None) -> str:
-    scope = f"文档《{doc_name}》" if doc_name else "知识库"
+def _attach_neighbors(search_results: List[dict], window: int):
+    """为每个命中块补充前后 window 个相邻块（按 chunk_index 区间从 chunk_store 读取），写入 result["context"]
+
+    同一文档中每个 chunk_index 只纳入一次：已被前面命中纳入的块（包括命中块本身）不再重复，
+    全部已被纳入时 context 为空串。
+    """
+    included: Dict[str, Set[int]] = {}
+    for result in search_results:
+        seen = included.setdefault(result["doc_id"], set())
+        index = result["chunk_index"]
+        parts = []
+        for chunk in chunk_store.get_chunk_range(result["doc_id"], index - window, index + window):
+            if chunk["chunk_index"] not in seen:
+                seen.add(chunk["chunk_index"])
+                parts.append(chunk["content"])
+        result["context"] = "\n".join(parts)
+
+
+def _build_system_prompt(context: str, scope: Optional[str] = None) -> str:
+    scope = scope or "知识库"
     if context:
         return f"""你是一个专业的知识库助手。请基于以下从{scope}中检索到的相关内容回答用户问题。
 
@@ -38,14 +60,57 @@ def _build_system_prompt(context: str, doc_name: Optional[str] = None) -> str:
         return f"你是一个专业的知识库助手，请回答用户的问题。当前检索范围为{scope}，如果其中没有相关内容，请直接说明。"
 
 
+def _build_sources(search_results: List[dict]) -> List[dict]:
+    return [
+        {
+            "doc_name": r["doc_name"],
+            "content": r["content"][:200],
+            "score": round(r["score"], 4),
+        }
+        for r in search_results
+    ]
+
+
+async def _retrieve(
+    question: str,
+    top_k: int,
+    doc_ids: Optional[List[str]],
+    tag: Optional[str]
+) -> List[dict]:
+    """查询向量化 + 向量检索（交互优先级，经准入控制后在线程池执行），过滤低相关度结果"""
+    if not question:
+        return []
+    async with admission.slot("embedding", Priority.INTERACTIVE):
+        query_embedding = await asyncio.to_thread(get_embedding, question)
+    async with admission.slot("milvus", Priority.INTERACTIVE):
+        raw = await asyncio.to_thread(
+            search_similar, query_embedding, top_k, None, doc_ids, tag
+        )
+    results = [r for r in raw if r["score"] > 0.3]
+    if results and settings.context_neighbor_chunks > 0:
+        await asyncio.to_thread(_attach_neighbors, results, settings.context_neighbor_chunks)
+    return results
+
+
 async def rag_chat_stream(
     messages: List[dict],
     top_k: int = 5,
-    doc_id: Optional[str] = None,
-    doc_name: Optional[str] = None
-) -> AsyncGenerator[str, None]:
-    """RAG 流式问答：embedding/检索在线程池运行，GLM 流式通过队列桥接"""
-    client = ZhipuAI(api_key=settings.zhipu_api_key)
+    doc_ids: Optional[List[str]] = None,
+    tag: Optional[str] = None,
+    scope: Optional[str] = None,
+    stop: Optional[threading.Event] = None,
+    on_exit: Optional[Callable[[], None]] = None
+) -> AsyncGenerator[bytes, None]:
+    """RAG 流式问答：embedding/检索在线程池运行，GLM 流式通过队列桥接
+
+    GLM 生成的并发名额（admission "chat"）由调用方在开始响应前获取，以便饱和时直接返回 429。
+    stop 被置位（客户端断开）后 GLM 线程在下一个 token 处停止并关闭上游连接；
+    on_exit 在事件循环中恰好调用一次：GLM 线程启动后于线程结束时调用，未启动则在生成器结束时调用，
+    调用方据此归还生成名额，保证名额释放时不再有线程占用 GLM 连接。
+    """
+    client = get_client()
+    stop = stop or threading.Event()
+    worker: Optional[asyncio.Future] = None
 
     user_question = ""
     for msg in reversed(messages):
@@ -53,77 +118,81 @@ async def rag_chat_stream(
             user_question = msg["content"]
             break
 
-    # ① 异步执行阻塞的 embedding + 向量检索
-    search_results: List[dict] = []
-    sources: List[dict] = []
-    if user_question:
-        query_embedding = await asyncio.to_thread(get_embedding, user_question)
-        raw = await asyncio.to_thread(search_similar, query_embedding, top_k, doc_id)
-        search_results = [r for r in raw if r["score"] > 0.3]
-        sources = [
-            {
-                "doc_name": r["doc_name"],
-                "content": r["content"][:200],
-                "score": round(r["score"], 4),
-            }
-            for r in search_results
-        ]
-
-    context = _build_context(search_results)
-    system_prompt = _build_system_prompt(context, doc_name)
-    history = [
-        {"role": m["role"], "content": m["content"]}
-        for m in messages[-10:]
-    ]
+    try:
+        # ① 异步执行阻塞的 embedding + 向量检索
+        search_results = await _retrieve(user_question, top_k, doc_ids, tag)
+        sources = _build_sources(search_results)
 
-    # ② 先推送 sources
-    yield f"data: {json.dumps({'type': 'sources', 'sources': sources}, ensure_ascii=False)}\n\n"
-
-    # ③ 同步 GLM 流式迭代 → 线程池 + asyncio.Queue → 异步 yield
-    loop = asyncio.get_running_loop()
-    queue: asyncio.Queue = asyncio.Queue()
-
-    def _glm_stream_worker() -> None:
-        """在线程池中运行同步 GLM 流式调用，把每个 token 放入队列"""
-        try:
-            response = client.chat.completions.create(
-                model=settings.chat_model,
-                messages=[{"role": "system", "content": system_prompt}] + history,
-                stream=True,
-                temperature=0.7,
-                max_tokens=2048,
-            )
-            for chunk in response:
-                delta = chunk.choices[0].delta if chunk.choices else None
-                if delta and delta.content:
-                    loop.call_soon_threadsafe(queue.put_nowait, delta.content)
-        except Exception as exc:
-            loop.call_soon_threadsafe(queue.put_nowait, exc)
-        finally:
-            loop.call_soon_threadsafe(queue.put_nowait, None)  # 结束哨兵
-
-    loop.run_in_executor(None, _glm_stream_worker)
-
-    # 逐 token yield 给 FastAPI StreamingResponse
-    while True:
-        item = await queue.get()
-        if item is None:
-            break
-        if isinstance(item, Exception):
-            raise item
-        yield f"data: {json.dumps({'type': 'content', 'content': item}, ensure_ascii=False)}\n\n"
+        context = _build_context(search_results)
+        system_prompt = _build_system_prompt(context, scope)
+        history = [
+            {"role": m["role"], "content": m["content"]}
+            for m in messages[-10:]
+        ]
 
-    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+        # ② 先推送 sources
+        yield encode_event({"type": "sources", "sources": sources})
+        if stop.is_set():
+            return
+
+        # ③ 同步 GLM 流式迭代 → 线程池 + asyncio.Queue → 异步 yield
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def _glm_stream_worker() -> None:
+            """在线程池中运行同步 GLM 流式调用，把每个 token 放入队列；stop 置位后关闭上游连接并退出"""
+            response = None
+            try:
+                response = client.chat.completions.create(
+                    model=settings.chat_model,
+                    messages=[{"role": "system", "content": system_prompt}] + history,
+                    stream=True,
+                    temperature=0.7,
+                    max_tokens=2048,
+                )
+                for chunk in response:
+                    if stop.is_set():
+                        break
+                    delta = chunk.choices[0].delta if chunk.choices else None
+                    if delta and delta.content:
+                        loop.call_soon_threadsafe(queue.put_nowait, delta.content)
+            except Exception as exc:
+                loop.call_soon_threadsafe(queue.put_nowait, exc)
+            finally:
+                http_response = getattr(response, "response", None)
+                if http_response is not None:
+                    http_response.close()
+                loop.call_soon_threadsafe(queue.put_nowait, None)  # 结束哨兵
+
+        worker = loop.run_in_executor(None, _glm_stream_worker)
+        if on_exit:
+            worker.add_done_callback(lambda _: on_exit())
+
+        # 按刷新策略合并 token 后 yield 给 FastAPI StreamingResponse，减少小帧与系统调用
+        async for text in coalesce_deltas(
+            queue,
+            flush_interval=settings.stream_flush_interval_ms / 1000,
+            flush_chars=settings.stream_flush_chars,
+        ):
+            yield encode_event({"type": "content", "content": text})
+
+        yield encode_event({"type": "done"})
+    finally:
+        # 不含 await：生成器被取消或关闭时也能同步执行完
+        stop.set()
+        if worker is None and on_exit:
+            on_exit()
 
 
 async def rag_chat(
     messages: List[dict],
     top_k: int = 5,
-    doc_id: Optional[str] = None,
-    doc_name: Optional[str] = None
+    doc_ids: Optional[List[str]] = None,
+    tag: Optional[str] = None,
+    scope: Optional[str] = None
 ) -> dict:
     """RAG 非流式问答（用于 /api/chat/ 接口）"""
-    client = ZhipuAI(api_key=settings.zhipu_api_key)
+    client = get_client()
 
     user_question = ""
     for msg in reversed(messages):
@@ -131,20 +200,19 @@ async def rag_chat(
             user_question = msg["content"]
             break
 
-    search_results: List[dict] = []
-    if user_question:
-        query_embedding = await asyncio.to_thread(get_embedding, user_question)
-        raw = await asyncio.to_thread(search_similar, query_embedding, top_k, doc_id)
-        search_results = [r for r in raw if r["score"] > 0.3]
+    search_results = await _retrieve(user_question, top_k, doc_ids, tag)
 
     context = _build_context(search_results)
-    system_prompt = _build_system_prompt(context, doc_name)
+    system_prompt = _build_system_prompt(context, scope)
     history = [
         {"role": m["role"], "content": m["content"]}
         for m in messages[-10:]
     ]
 
-    response = await asyncio.to_thread(
+    # 名额在 GLM 调用线程结束后才归还：请求被取消时线程仍在占用连接
+    acquired_at = await admission.acquire("chat")
+    call = asyncio.get_running_loop().run_in_executor(
+        None,
         lambda: client.chat.completions.create(
             model=settings.chat_model,
             messages=[{"role": "system", "content": system_prompt}] + history,
@@ -152,13 +220,8 @@ async def rag_chat(
             max_tokens=2048,
         )
     )
+    call.add_done_callback(lambda _: admission.release("chat", acquired_at))
+    response = await asyncio.shield(call)
 
-    sources = [
-        {
-            "doc_name": r["doc_name"],
-            "content": r["content"][:200],
-            "score": round(r["score"], 4),
-        }
-        for r in search_results
-    ]
+    sources = _build_sources(search_results)
     return {"answer": response.choices[0].message.content, "sources": sources}
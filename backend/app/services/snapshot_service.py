@@ -0,0 +1,196 @@
+import json
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import get_settings
+from app.services import chunk_store
+from app.services.milvus_service import (
+    build_document_index, get_active_embedding, get_milvus_client, get_row_count, get_soft_deleted_ids,
+    init_collection, insert_chunk_rows, is_text_in_milvus, resolve_collection,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SNAPSHOT_VERSION = 2  # 2：块 id 由 chunk_store 分配，manifest 带软删除登记与 embedding 后端
+META_FIELDS = ["id", "doc_id", "tag", "doc_name", "doc_type", "content", "chunk_index", "created_at"]
+# 单批向量字节数上限：insert 请求与 query_iterator 响应都远低于 gRPC 默认 64MB 的消息上限
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+MAX_BATCH_ROWS = 16_384  # query_iterator 单批行数上限（pymilvus 校验）
+
+
+def _rows_per_batch(dim: int, batch_size: Optional[int]) -> int:
+    """按向量字节数确定每批行数（float32，dim * 4 字节/行，且不超过 MAX_BATCH_ROWS），batch_size 为行数上限"""
+    rows = min(MAX_BATCH_ROWS, max(1, MAX_BATCH_BYTES // (dim * 4)))
+    return min(rows, batch_size) if batch_size else rows
+
+
+def export_snapshot(
+    out_dir: str,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Any]:
+    """导出知识库快照：每批写一对 part-NNNNN.parquet（文本与元数据）+ part-NNNNN.npy（float32 向量）
+
+    通过 query_iterator 分批读取向量（每批行数按向量字节数限制），按块 id 从 chunk_store 补全文本与元数据，
+    内存中最多保留一批数据；最后写入 manifest.json（含软删除登记）。
+    只读：不调用 init_collection，不改名、不建别名、不回填、不构建文档级向量，直接读取别名指向的实体 collection。
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    client = get_milvus_client()
+    collection = resolve_collection()
+    if not client.has_collection(collection):
+        raise ValueError(f"collection {settings.collection_name} 不存在")
+    active = get_active_embedding()
+    if is_text_in_milvus() and not chunk_store.get_meta(f"backfilled:{collection}"):
+        raise ValueError("旧版 collection 的文本尚未导入块存储：请先启动一次服务完成升级后再导出")
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    fields = META_FIELDS
+    iterator = client.query_iterator(
+        collection_name=collection,
+        filter='doc_id != ""',
+        output_fields=["doc_id", "embedding"],
+        batch_size=_rows_per_batch(active["dim"], batch_size),
+    )
+    parts: List[Dict[str, Any]] = []
+    total = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            chunks = chunk_store.get_chunks([row["id"] for row in batch])
+            batch = [row for row in batch if row["id"] in chunks]
+            if not batch:
+                continue
+            doc_ids = {row["doc_id"] for row in batch}
+            docs = {doc_id: chunk_store.get_document(doc_id) or {} for doc_id in doc_ids}
+            records = [{**docs[row["doc_id"]], **chunks[row["id"]]} for row in batch]
+            name = f"part-{len(parts):05d}"
+            vectors = np.asarray([row["embedding"] for row in batch], dtype=np.float32)
+            table = pa.table({f: [r.get(f, "") for r in records] for f in fields})
+            pq.write_table(table, out / f"{name}.parquet", compression="zstd")
+            np.save(out / f"{name}.npy", vectors)
+            parts.append({"name": name, "rows": len(batch)})
+            total += len(batch)
+            if progress:
+                progress(total)
+    finally:
+        iterator.close()
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "collection_name": settings.collection_name,
+        "embedding_backend": active["backend"],
+        "embedding_model": active["model"],
+        "embedding_dim": active["dim"],
+        "fields": fields,
+        "rows": total,
+        "parts": parts,
+        "soft_deleted": sorted(get_soft_deleted_ids()),
+        "created_at": datetime.now().isoformat(),
+    }
+    with open(out / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    logger.info("快照导出完成：%d 行，耗时 %.1fs", total, time.perf_counter() - start)
+    return manifest
+
+
+def import_snapshot(
+    in_dir: str,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """导入快照：按 part 顺序读取，向量以内存映射方式加载，分批写入 Milvus 与 chunk_store，无需重新向量化
+
+    目标 collection 必须为空。chunk_store 为空时写入全部文本；chunk_store 已有数据时，只有其中的块与快照
+    完全一致（相同的块 id 与 doc_id，如 Lite → Standalone 沿用同一块存储）才允许导入，且只写入向量。
+    每批行数按向量字节数限制，快照中的软删除登记一并恢复。
+    """
+    import numpy as np
+    import pyarrow.parquet as pq
+
+    src = Path(in_dir)
+    with open(src / "manifest.json", "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"不支持的快照版本: {manifest.get('version')}（当前版本 {SNAPSHOT_VERSION}），请用同版本服务重新导出"
+        )
+
+    init_collection()
+    client = get_milvus_client()
+    active = get_active_embedding()
+    source = (manifest["embedding_backend"], manifest["embedding_model"], manifest["embedding_dim"])
+    if source != (active["backend"], active["model"], active["dim"]):
+        raise ValueError(
+            f"快照的 embedding（{source[0]} 后端 {source[1]}，{source[2]} 维）"
+            f"与目标 collection（{active['backend']} 后端 {active['model']}，{active['dim']} 维）不一致"
+        )
+    if get_row_count():
+        raise ValueError("目标 collection 非空：快照只能导入到空的 collection，请先清空或使用新的 collection")
+    rows_per_batch = _rows_per_batch(manifest["embedding_dim"], batch_size)
+    # 旧版快照可能没有 id / tag 字段：多余字段丢弃，缺失的 tag 等补空串、id 由 chunk_store 分配
+    fields = [f for f in manifest["fields"] if f in META_FIELDS]
+    vectors_only = bool(chunk_store.get_all_document_ids())
+    if vectors_only:
+        _check_chunk_store_matches(src, manifest, fields, rows_per_batch)
+        fields = [f for f in ("id", "doc_id", "tag") if f in fields]
+    missing = {f: "" for f in META_FIELDS if f not in fields and f != "id"}
+    # 先恢复软删除登记，被软删除的文档导入过程中也不会出现在检索结果里
+    chunk_store.add_soft_deleted(manifest.get("soft_deleted", []))
+    total = 0
+    doc_ids = set()
+    start = time.perf_counter()
+    for part in manifest["parts"]:
+        vectors = np.load(src / f"{part['name']}.npy", mmap_mode="r")
+        parquet = pq.ParquetFile(src / f"{part['name']}.parquet")
+        offset = 0
+        for record_batch in parquet.iter_batches(batch_size=rows_per_batch, columns=fields):
+            columns = record_batch.to_pydict()
+            n = record_batch.num_rows
+            rows = [{**missing, **{f: columns[f][i] for f in fields}} for i in range(n)]
+            insert_chunk_rows(rows, vectors[offset:offset + n], store_text=not vectors_only)
+            doc_ids.update(row["doc_id"] for row in rows)
+            offset += n
+            total += n
+            if progress:
+                progress(total)
+
+    client.flush(settings.collection_name)
+    build_document_index(doc_ids=sorted(doc_ids))
+    logger.info(
+        "快照导入完成：%d 行%s，耗时 %.1fs", total, "（仅向量，沿用已有块存储）" if vectors_only else "",
+        time.perf_counter() - start,
+    )
+    return total
+
+
+def _check_chunk_store_matches(src: Path, manifest: Dict[str, Any], fields: List[str], rows_per_batch: int):
+    """chunk_store 非空时，校验其中的块与快照完全一致（块数相同，每个块 id 都在且属于同一文档），否则抛出 ValueError"""
+    if "id" not in fields or is_text_in_milvus():
+        raise ValueError("目标块存储非空：该快照或目标 collection 不支持只导入向量，请使用空的块存储（--chunk-store）")
+    if chunk_store.count_all_chunks() != manifest["rows"] or not _chunk_ids_match(src, manifest, rows_per_batch):
+        raise ValueError("目标块存储非空且与快照不一致：请使用空的块存储（--chunk-store）或导出该块存储对应的快照")
+
+
+def _chunk_ids_match(src: Path, manifest: Dict[str, Any], rows_per_batch: int) -> bool:
+    import pyarrow.parquet as pq
+
+    for part in manifest["parts"]:
+        parquet = pq.ParquetFile(src / f"{part['name']}.parquet")
+        for record_batch in parquet.iter_batches(batch_size=rows_per_batch, columns=["id", "doc_id"]):
+            columns = record_batch.to_pydict()
+            stored = chunk_store.get_chunk_doc_ids(columns["id"])
+            if any(stored.get(chunk_id) != doc_id for chunk_id, doc_id in zip(columns["id"], columns["doc_id"])):
+                return False
+    return True
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def _load_embedding_backend() -> None:
+    """加载当前 collection 记录的 embedding 后端；模型输出维度与 collection 不符时抛出 ValueError（不重试）"""
+    from app.services.embedding_service import get_backend
+    get_backend()
+
+
+def _init_milvus() -> None:
+    from app.services.milvus_service import init_collection
+    init_collection()
+
+
+def _load_collection() -> None:
+    from app.services.milvus_service import load_collection
+    load_collection()
+
+
+def _open_llm_client() -> None:
+    from app.services.embedding_service import get_client
+    get_client()
+
+
+def _dummy_search() -> None:
+    """用一个单位向量执行一次检索，预热索引与查询链路（维度取当前 collection 的实际维度）"""
+    from app.services.milvus_service import probe_vector, search_similar
+    search_similar(probe_vector(), top_k=1)
+
+
+# 预热步骤按顺序执行，名称用于在就绪探针中展示进度
+WARMUP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("init_collection", _init_milvus),
+    ("load_embedding_backend", _load_embedding_backend),
+    ("load_collection", _load_collection),
+    ("open_llm_client", _open_llm_client),
+    ("dummy_search", _dummy_search),
+]
+
+_state: Dict[str, Any] = {
+    "status": "pending",  # pending | running | ready | failed
+    "current_step": None,
+    "completed_steps": [],
+    "step_seconds": {},
+    "error": None,
+    "started_at": None,
+    "finished_at": None,
+}
+
+
+def get_warmup_state() -> Dict[str, Any]:
+    """返回预热进度快照"""
+    state = dict(_state)
+    state["completed_steps"] = list(_state["completed_steps"])
+    state["step_seconds"] = dict(_state["step_seconds"])
+    state["total_steps"] = len(WARMUP_STEPS)
+    return state
+
+
+def is_ready() -> bool:
+    return _state["status"] == "ready"
+
+
+async def run_warmup(retry_interval: Optional[float] = 5.0) -> None:
+    """依次执行预热步骤（阻塞调用放到线程池），失败时按间隔重试，直到全部完成"""
+    _state.update(status="running", started_at=time.time(), error=None)
+    start = time.perf_counter()
+
+    for name, step in WARMUP_STEPS:
+        if name in _state["completed_steps"]:
+            continue
+        _state["current_step"] = name
+        while True:
+            t0 = time.perf_counter()
+            try:
+                await asyncio.to_thread(step)
+                break
+            except Exception as e:
+                _state.update(status="failed", error=f"{name}: {e}")
+                logger.error("预热步骤 %s 失败: %s", name, e)
+                # ValueError 为配置错误（如 embedding 模型维度与 collection 不符），重试无意义
+                if retry_interval is None or isinstance(e, ValueError):
+                    return
+                await asyncio.sleep(retry_interval)
+                _state.update(status="running", error=None)
+        _state["step_seconds"][name] = round(time.perf_counter() - t0, 3)
+        _state["completed_steps"].append(name)
+
+    _state.update(status="ready", current_step=None, finished_at=time.time())
+    logger.info("预热完成，耗时 %.2fs：%s", time.perf_counter() - start, _state["step_seconds"])
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import zlib
+from typing import AsyncGenerator, AsyncIterable, Union
+
+try:  # orjson 可选：序列化更快，且直接输出 UTF-8 字节
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_event(payload: dict) -> bytes:
+    """编码一个 SSE 帧：data: <json>\\n\\n（非 ASCII 字符不转义）"""
+    if orjson is not None:
+        return b"data: " + orjson.dumps(payload) + b"\n\n"
+    return b"data: " + json.dumps(payload, ensure_ascii=False).encode() + b"\n\n"
+
+
+async def coalesce_deltas(
+    queue: asyncio.Queue,
+    flush_interval: float,
+    flush_chars: int,
+) -> AsyncGenerator[str, None]:
+    """合并队列中的文本增量：累计满 flush_chars 字符或距首个未发送增量超过 flush_interval 秒即输出
+
+    队列约定：str 为增量，None 为结束哨兵，Exception 会在输出已缓冲内容后抛出。
+    flush_interval <= 0 时不合并，逐条输出。
+    定时刷新通过 loop.call_at 向队列投递标记实现，避免每次等待都创建 wait_for 任务。
+    """
+    loop = asyncio.get_running_loop()
+    buffer: list[str] = []
+    size = 0
+    timer: asyncio.TimerHandle | None = None
+    marker: object | None = None  # 当前有效的刷新标记，过期标记直接忽略
+
+    def reset():
+        nonlocal buffer, size, timer, marker
+        if timer is not None:
+            timer.cancel()
+        buffer, size, timer, marker = [], 0, None, None
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                if buffer:
+                    yield "".join(buffer)
+                raise item
+            if not isinstance(item, str):
+                if item is marker and buffer:
+                    text = "".join(buffer)
+                    reset()
+                    yield text
+                continue
+
+            buffer.append(item)
+            size += len(item)
+            if size >= flush_chars or flush_interval <= 0:
+                text = "".join(buffer)
+                reset()
+                yield text
+            elif timer is None:
+                marker = object()
+                timer = loop.call_at(loop.time() + flush_interval, queue.put_nowait, marker)
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+
+async def gzip_stream(
+    frames: AsyncIterable[Union[str, bytes]],
+) -> AsyncGenerator[bytes, None]:
+    """对流式响应做 gzip 压缩，每帧后 SYNC_FLUSH，保证客户端能立即解出已发送的内容"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for frame in frames:
+        data = frame.encode() if isinstance(frame, str) else frame
+        yield compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
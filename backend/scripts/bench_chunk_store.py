@@ -0,0 +1,82 @@
+"""块文本存储基准：压缩率、按 id 批量读取（检索命中回填）与相邻块区间读取的延迟
+
+用法（在 backend 目录下）：
+    python scripts/bench_chunk_store.py --docs 2000 --chunks-per-doc 50 --path ./bench_chunk_store.db
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+CORPUS = (
+    "知识库助手基于检索增强生成，先将文档切分为文本块并向量化存入 Milvus，"
+    "提问时检索最相关的文本块作为上下文交给大模型生成回答。"
+    "Retrieval augmented generation combines a vector index with a language model. "
+)
+
+
+def _p(latencies, q):
+    latencies = sorted(latencies)
+    return latencies[max(0, int(len(latencies) * q) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--chunks-per-doc", type=int, default=50)
+    parser.add_argument("--chunk-chars", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--window", type=int, default=1, help="相邻块扩展窗口")
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--path", default="./bench_chunk_store.db")
+    args = parser.parse_args()
+
+    # 必须在导入 app 模块（读取配置）之前设置
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.path + suffix):
+            os.remove(args.path + suffix)
+    os.environ["CHUNK_STORE_PATH"] = args.path
+    from app.services import chunk_store
+
+    rng = random.Random(0)
+    text = CORPUS * (args.chunk_chars // len(CORPUS) + 2)
+    raw_bytes = 0
+    t0 = time.perf_counter()
+    for d in range(args.docs):
+        ids = chunk_store.allocate_ids(args.chunks_per_doc)
+        rows = []
+        for k, chunk_id in enumerate(ids):
+            start = rng.randrange(len(CORPUS))
+            content = text[start:start + args.chunk_chars]
+            raw_bytes += len(content.encode("utf-8"))
+            rows.append({
+                "id": chunk_id, "doc_id": f"doc_{d}", "chunk_index": k, "content": content,
+                "doc_name": f"doc_{d}.txt", "doc_type": "txt", "tag": "", "created_at": "2026-01-01",
+            })
+        chunk_store.put_chunks(rows)
+    total = args.docs * args.chunks_per_doc
+    print(f"write: {total} chunks in {time.perf_counter() - t0:.2f}s; "
+          f"text {raw_bytes / 1e6:.1f}MB -> file {os.path.getsize(args.path) / 1e6:.1f}MB")
+
+    lookup, neighbors = [], []
+    for _ in range(args.rounds):
+        ids = [rng.randint(1, total) for _ in range(args.top_k)]
+        t0 = time.perf_counter()
+        hits = chunk_store.get_chunks(ids)
+        lookup.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        for hit in hits.values():
+            chunk_store.get_chunk_range(hit["doc_id"], hit["chunk_index"] - args.window,
+                                        hit["chunk_index"] + args.window)
+        neighbors.append((time.perf_counter() - t0) * 1000)
+    print(f"get_chunks(top_k={args.top_k}): p50={statistics.median(lookup):.3f}ms p95={_p(lookup, 0.95):.3f}ms")
+    print(f"neighbors(window={args.window}): p50={statistics.median(neighbors):.3f}ms "
+          f"p95={_p(neighbors, 0.95):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""入库内存基准：按上传接口的实际路径向量化并调用真实的 milvus_service.insert_chunks，测量内存峰值与 GC 耗时
+
+embedding 以智谱后端的方式逐批返回（SDK 给出 Python float 列表，每批立即转为 float32），
+Milvus 客户端替换为只计数、不保留数据的桩，chunk_store 写入临时目录；
+文档级向量按插入批累加，Milvus 行数据在 insert_chunk_rows 中按 insert_batch_size 分批转换。
+
+    legacy_list    向量全量保存为 List[List[float]]（最初的实现）
+    concat         各批 ndarray 存入列表后 np.concatenate，列表在写入期间仍被引用（此前的上传接口）
+    preallocated   预先分配 (n, dim) float32 数组，逐批写入（当前上传接口）
+
+用法（在 backend 目录下）：
+    python scripts/bench_ingest_memory.py --chunks 10000 --dim 2048
+
+实测（10000 块 x 2048 维，float32 数组本身 78.1MB；tracemalloc 峰值）：
+             mode    peak MB     GC ms  GC runs
+      legacy_list      630.5     389.1       16
+           concat      172.6       6.4        1
+     preallocated       94.4       6.1        1
+preallocated 的峰值为整篇文档的向量数组加一个插入批的列表转换；耗时主要花在模拟 SDK 的 float 列表转换上，三者相近。
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+API_BATCH = 25
+
+
+class _StubClient:
+    """只记录写入行数的 Milvus 客户端桩"""
+
+    def __init__(self):
+        self.rows = 0
+
+    def insert(self, collection_name, data):
+        self.rows += len(data)
+        return {"ids": [row["id"] for row in data]}
+
+    def upsert(self, collection_name, data):
+        return {"upsert_count": len(data)}
+
+    def delete(self, collection_name, filter):
+        return {"delete_count": 0}
+
+
+def _api_batches(chunks: int, dim: int):
+    """模拟智谱后端：SDK 返回 Python float 列表，随即转为 float32"""
+    rng = np.random.default_rng(0)
+    for start in range(0, chunks, API_BATCH):
+        n = min(API_BATCH, chunks - start)
+        yield start, np.asarray(rng.random((n, dim), dtype=np.float32).tolist(), dtype=np.float32)
+
+
+def legacy_list(chunks: int, dim: int):
+    embeddings = []
+    for _, batch in _api_batches(chunks, dim):
+        embeddings.extend(batch.tolist())
+    return embeddings, None
+
+
+def concat(chunks: int, dim: int):
+    parts = [batch for _, batch in _api_batches(chunks, dim)]
+    return np.concatenate(parts), parts
+
+
+def preallocated(chunks: int, dim: int):
+    embeddings = np.empty((chunks, dim), dtype=np.float32)
+    for start, batch in _api_batches(chunks, dim):
+        embeddings[start:start + len(batch)] = batch
+    return embeddings, None
+
+
+def _ingest(embed, chunks: int, dim: int):
+    """embed 返回 (向量, 写入期间仍被引用的中间结果)，随后调用真实的 insert_chunks"""
+    from app.services import milvus_service
+
+    embeddings, retained = embed(chunks, dim)
+    milvus_service.insert_chunks(f"doc-{embed.__name__}", "bench.txt", "txt", ["x"] * chunks, embeddings)
+    del retained
+
+
+def _measure(embed, chunks: int, dim: int) -> dict:
+    gc_time = 0.0
+    gc_runs = 0
+    started = [0.0]
+
+    def on_gc(phase, info):
+        nonlocal gc_time, gc_runs
+        if phase == "start":
+            started[0] = time.perf_counter()
+        else:
+            gc_time += time.perf_counter() - started[0]
+            gc_runs += 1
+
+    gc.collect()
+    gc.callbacks.append(on_gc)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        _ingest(embed, chunks, dim)
+        wall = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        gc.callbacks.remove(on_gc)
+    return {"peak_mb": peak / 1024 / 1024, "gc_ms": gc_time * 1000, "gc_runs": gc_runs, "wall_s": wall}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=2048)
+    args = parser.parse_args()
+
+    from app.config import get_settings
+    from app.services import milvus_service
+
+    get_settings().chunk_store_path = os.path.join(tempfile.mkdtemp(prefix="bench-ingest-"), "chunk_store.db")
+    client = _StubClient()
+    milvus_service._client = client
+    milvus_service._doc_collection = "bench_docs"
+    milvus_service._active = {
+        "collection": "bench", "backend": "zhipu", "model": "bench", "dim": args.dim,
+        "generation": None, "doc_index_ready": True,
+    }
+
+    array_mb = args.chunks * args.dim * 4 / 1024 / 1024
+    print(f"{args.chunks} chunks x {args.dim} dim, float32 array {array_mb:.1f} MB")
+    print(f"{'mode':>14} {'peak MB':>10} {'GC ms':>9} {'GC runs':>8} {'wall':>7}")
+    for embed in (legacy_list, concat, preallocated):
+        r = _measure(embed, args.chunks, args.dim)
+        print(f"{embed.__name__:>14} {r['peak_mb']:>10.1f} {r['gc_ms']:>9.1f} {r['gc_runs']:>8} {r['wall_s']:>6.2f}s")
+    assert client.rows == 3 * args.chunks
+
+
+if __name__ == "__main__":
+    main()
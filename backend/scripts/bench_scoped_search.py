@@ -0,0 +1,108 @@
+"""限定范围检索基准：对比分区键布局与普通布局下，按文档过滤检索的延迟随语料规模的变化
+
+用法（在 backend 目录下）：
+    python scripts/bench_scoped_search.py --uri ./bench_milvus.db --sizes 10000 50000 200000
+
+每个文档固定 CHUNKS_PER_DOC 个块，语料增长即文档数增长；
+分区键布局下，单文档过滤检索只扫描 doc_id 哈希命中的分区（约 1/64 的数据）。
+文档数超过分区数后延迟仍随语料增长，收益取决于部署方式：
+
+Milvus Lite 实测（--rounds 100，单文档过滤 p50）：
+      10000 块（200 文档）    flat 40.1ms   partition_key 17.8ms
+      50000 块（1000 文档）   flat 193.4ms  partition_key 126.9ms
+     200000 块（4000 文档）   flat 693.7ms  partition_key 731.6ms
+
+Milvus Lite 不做分段级并行扫描，语料较大时分区裁剪的收益被分区数开销抵消；
+因此 PARTITION_KEY_FIELD 默认不启用；Standalone / 集群部署请以实测为准，文档数远超分区数时可调大 NUM_PARTITIONS。
+"""
+import argparse
+import random
+import statistics
+import time
+
+from pymilvus import MilvusClient, DataType
+
+CHUNKS_PER_DOC = 50
+DIM = 256
+
+
+def _create(client: MilvusClient, name: str, partition_key: bool):
+    if client.has_collection(name):
+        client.drop_collection(name)
+    kwargs = {"auto_id": True, "enable_dynamic_field": False}
+    if partition_key:
+        kwargs["partition_key_field"] = "doc_id"
+        kwargs["num_partitions"] = 64
+    schema = MilvusClient.create_schema(**kwargs)
+    schema.add_field("id", DataType.INT64, is_primary=True)
+    schema.add_field("doc_id", DataType.VARCHAR, max_length=64)
+    schema.add_field("embedding", DataType.FLOAT_VECTOR, dim=DIM)
+    index_params = MilvusClient.prepare_index_params()
+    index_params.add_index(field_name="embedding", index_type="AUTOINDEX", metric_type="COSINE")
+    client.create_collection(collection_name=name, schema=schema, index_params=index_params)
+
+
+def _fill(client: MilvusClient, name: str, start: int, end: int, rng: random.Random):
+    batch = []
+    for i in range(start, end):
+        batch.append({
+            "doc_id": f"doc_{i // CHUNKS_PER_DOC}",
+            "embedding": [rng.random() for _ in range(DIM)],
+        })
+        if len(batch) >= 5000:
+            client.insert(collection_name=name, data=batch)
+            batch = []
+    if batch:
+        client.insert(collection_name=name, data=batch)
+
+
+def _measure(client: MilvusClient, name: str, num_docs: int, rng: random.Random,
+             rounds: int, multi: int) -> tuple[float, float]:
+    latencies = []
+    for _ in range(rounds):
+        ids = [f"doc_{rng.randrange(num_docs)}" for _ in range(multi)]
+        expr = (f'doc_id == "{ids[0]}"' if multi == 1
+                else "doc_id in [" + ", ".join(f'"{i}"' for i in ids) + "]")
+        query = [rng.random() for _ in range(DIM)]
+        t0 = time.perf_counter()
+        client.search(collection_name=name, data=[query], limit=5, filter=expr,
+                      search_params={"metric_type": "COSINE", "params": {}})
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="./bench_milvus.db")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--multi", type=int, default=5, help="多文档检索时的文档数")
+    args = parser.parse_args()
+
+    client = MilvusClient(uri=args.uri)
+    rng = random.Random(42)
+    layouts = {"bench_flat": False, "bench_partition_key": True}
+    for name, pk in layouts.items():
+        _create(client, name, pk)
+
+    print(f"{'chunks':>10} {'layout':>20} {'1-doc p50':>10} {'1-doc p95':>10} "
+          f"{args.multi}-doc p50 {args.multi}-doc p95")
+    filled = 0
+    for size in sorted(args.sizes):
+        for name in layouts:
+            _fill(client, name, filled, size, rng)
+            client.flush(name)
+        filled = size
+        num_docs = size // CHUNKS_PER_DOC
+        for name in layouts:
+            p50, p95 = _measure(client, name, num_docs, rng, args.rounds, 1)
+            m50, m95 = _measure(client, name, num_docs, rng, args.rounds, args.multi)
+            print(f"{size:>10} {name:>20} {p50:>9.2f}ms {p95:>9.2f}ms {m50:>9.2f}ms {m95:>9.2f}ms")
+
+    for name in layouts:
+        client.drop_collection(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""SSE 帧编码基准：对比逐 delta 成帧（旧实现）与合并刷新 + 快速编码（新实现）
+
+模拟若干并发流，每个流按固定间隔产生 GLM 文本增量，统计帧数、每秒帧数、
+每个流消耗的 CPU 时间，以及开启 gzip 后的传输字节数。
+
+用法（在 backend 目录下）：
+    python scripts/bench_sse_frames.py --streams 200 --deltas 400 --delay-ms 2
+
+--delay-ms 0 时增量一次性全部入队，合并窗口内可攒满 --chars，得到的是合并的上限；
+默认 2ms 间隔更接近真实 GLM 输出，30ms 窗口内只能攒到约 15 个增量，帧数与 CPU 的降幅都小得多。
+两种设置的结果需分别注明，不要混用。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.utils.sse import coalesce_deltas, encode_event, gzip_stream  # noqa: E402
+
+DELTAS = ["的", "知识", "库", "助手", "，", "根据", "文档", "内容", "回答", "。", "Milvus", " ", "RAG"]
+
+
+async def _produce(queue: asyncio.Queue, count: int, delay: float):
+    for i in range(count):
+        queue.put_nowait(DELTAS[i % len(DELTAS)])
+        if delay:
+            await asyncio.sleep(delay)
+    queue.put_nowait(None)
+
+
+async def _legacy_stream(queue: asyncio.Queue):
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        yield f"data: {json.dumps({'type': 'content', 'content': item}, ensure_ascii=False)}\n\n"
+
+
+async def _coalesced_stream(queue: asyncio.Queue, interval: float, chars: int):
+    async for text in coalesce_deltas(queue, interval, chars):
+        yield encode_event({"type": "content", "content": text})
+
+
+async def _consume(frames) -> tuple[int, int]:
+    count = size = 0
+    async for frame in frames:
+        count += 1
+        size += len(frame)
+    return count, size
+
+
+async def _run(mode: str, args) -> dict:
+    async def one():
+        queue: asyncio.Queue = asyncio.Queue()
+        producer = asyncio.create_task(_produce(queue, args.deltas, args.delay_ms / 1000))
+        if mode == "legacy":
+            frames = _legacy_stream(queue)
+        else:
+            frames = _coalesced_stream(queue, args.interval_ms / 1000, args.chars)
+            if mode == "coalesced+gzip":
+                frames = gzip_stream(frames)
+        result = await _consume(frames)
+        await producer
+        return result
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(args.streams)))
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+    frames = sum(r[0] for r in results)
+    return {
+        "frames": frames,
+        "bytes": sum(r[1] for r in results),
+        "frames_per_sec": frames / wall,
+        "cpu_ms_per_stream": cpu * 1000 / args.streams,
+        "wall_s": wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--deltas", type=int, default=400, help="每个流的增量数")
+    parser.add_argument("--delay-ms", type=float, default=2, help="增量产生间隔")
+    parser.add_argument("--interval-ms", type=float, default=30, help="合并刷新时间窗口")
+    parser.add_argument("--chars", type=int, default=64, help="合并刷新字符阈值")
+    args = parser.parse_args()
+
+    print(f"{'mode':>16} {'frames':>9} {'bytes':>11} {'frames/s':>10} {'CPU/stream':>11} {'wall':>7}")
+    for mode in ("legacy", "coalesced", "coalesced+gzip"):
+        r = asyncio.run(_run(mode, args))
+        print(f"{mode:>16} {r['frames']:>9} {r['bytes']:>11} {r['frames_per_sec']:>10.0f} "
+              f"{r['cpu_ms_per_stream']:>9.2f}ms {r['wall_s']:>6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""两阶段检索基准：对比全库块检索（flat）与“文档级向量选候选文档 → 候选文档内块检索”的延迟与召回率
+
+用法（在 backend 目录下）：
+    python scripts/bench_two_stage.py --uri ./bench_milvus.db --sizes 50000 200000 1000000 --coarse 10 20 50
+
+语料为合成的聚类数据：若干主题，每个文档围绕所属主题生成一个文档中心，块向量围绕文档中心分布；
+文档块数服从长尾分布（少数“话痨”文档占大量块）。查询取自随机块加噪声。
+召回率以 numpy 精确检索的全局 Top-K 为基准（recall@K），flat 一列反映 AUTOINDEX 自身的近似误差。
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+from pymilvus import MilvusClient, DataType
+
+DIM = 256
+TOPICS = 200
+MEAN_CHUNKS_PER_DOC = 40
+# 噪声幅度（相对单位向量）：文档偏离主题、块偏离文档中心、查询偏离所取的块
+DOC_SPREAD = 0.6
+CHUNK_SPREAD = 2.0
+QUERY_NOISE = 0.7
+
+
+def _create(client: MilvusClient, name: str, pk_field: str, pk_type: DataType, partition_key: bool):
+    if client.has_collection(name):
+        client.drop_collection(name)
+    kwargs = {"auto_id": False, "enable_dynamic_field": False}
+    if partition_key:
+        kwargs["partition_key_field"] = "doc_id"
+        kwargs["num_partitions"] = 64
+    schema = MilvusClient.create_schema(**kwargs)
+    if pk_type == DataType.VARCHAR:
+        schema.add_field(pk_field, DataType.VARCHAR, max_length=64, is_primary=True)
+    else:
+        schema.add_field(pk_field, DataType.INT64, is_primary=True)
+        schema.add_field("doc_id", DataType.VARCHAR, max_length=64)
+    schema.add_field("embedding", DataType.FLOAT_VECTOR, dim=DIM)
+    index_params = MilvusClient.prepare_index_params()
+    index_params.add_index(field_name="embedding", index_type="AUTOINDEX", metric_type="COSINE")
+    client.create_collection(collection_name=name, schema=schema, index_params=index_params)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def _corpus(size: int, rng: np.random.Generator):
+    """返回 (块向量, 每块所属文档序号)；文档块数为对数正态分布"""
+    topics = _normalize(rng.standard_normal((TOPICS, DIM)).astype(np.float32))
+    counts = []
+    while sum(counts) < size:
+        counts.append(max(1, int(rng.lognormal(np.log(MEAN_CHUNKS_PER_DOC) - 0.5, 1.0))))
+    counts[-1] -= sum(counts) - size
+    owner = np.repeat(np.arange(len(counts)), counts)
+    doc_centers = _normalize(topics[rng.integers(0, TOPICS, len(counts))]
+                             + DOC_SPREAD * _normalize(rng.standard_normal((len(counts), DIM))).astype(np.float32))
+    noise = _normalize(rng.standard_normal((size, DIM))).astype(np.float32)
+    vectors = _normalize(doc_centers[owner] + CHUNK_SPREAD * noise)
+    return vectors.astype(np.float32), owner
+
+
+def _centroids(vectors: np.ndarray, owner: np.ndarray) -> np.ndarray:
+    sums = np.zeros((owner.max() + 1, DIM), dtype=np.float32)
+    np.add.at(sums, owner, vectors)
+    return _normalize(sums)
+
+
+def _fill(client: MilvusClient, vectors: np.ndarray, owner: np.ndarray, centroids: np.ndarray):
+    for start in range(0, len(vectors), 5000):
+        end = min(start + 5000, len(vectors))
+        client.insert(collection_name="bench_chunks", data=[
+            {"id": i, "doc_id": f"doc_{owner[i]}", "embedding": vectors[i].tolist()} for i in range(start, end)
+        ])
+    for start in range(0, len(centroids), 5000):
+        end = min(start + 5000, len(centroids))
+        client.insert(collection_name="bench_docs", data=[
+            {"doc_id": f"doc_{d}", "embedding": centroids[d].tolist()} for d in range(start, end)
+        ])
+    client.flush("bench_chunks")
+    client.flush("bench_docs")
+
+
+def _search(client: MilvusClient, name: str, query: list, limit: int, expr: str = "", pk: str = "id") -> list:
+    kwargs = {"collection_name": name, "data": [query], "limit": limit, "output_fields": [pk],
+              "search_params": {"metric_type": "COSINE", "params": {}}}
+    if expr:
+        kwargs["filter"] = expr
+    return [hit["entity"][pk] for hit in client.search(**kwargs)[0]]
+
+
+def _two_stage(client: MilvusClient, query: list, top_k: int, coarse: int) -> list:
+    doc_ids = _search(client, "bench_docs", query, coarse, pk="doc_id")
+    expr = "doc_id in [" + ", ".join(f'"{d}"' for d in doc_ids) + "]"
+    return _search(client, "bench_chunks", query, top_k, expr)
+
+
+def _stats(latencies: list) -> tuple[float, float]:
+    latencies = sorted(latencies)
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="./bench_milvus.db")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50_000, 200_000, 1_000_000])
+    parser.add_argument("--coarse", type=int, nargs="+", default=[10, 20, 50], help="第一阶段候选文档数")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    client = MilvusClient(uri=args.uri)
+    rng = np.random.default_rng(42)
+
+    print(f"{'chunks':>10} {'docs':>7} {'mode':>12} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+    for size in args.sizes:
+        vectors, owner = _corpus(size, rng)
+        centroids = _centroids(vectors, owner)
+        _create(client, "bench_chunks", "id", DataType.INT64, partition_key=True)
+        _create(client, "bench_docs", "doc_id", DataType.VARCHAR, partition_key=False)
+        _fill(client, vectors, owner, centroids)
+
+        picks = rng.integers(0, size, args.rounds)
+        queries = _normalize(vectors[picks] + QUERY_NOISE * _normalize(rng.standard_normal((args.rounds, DIM))))
+        # 基准：numpy 精确检索的全局 Top-K
+        truth = [set(np.argpartition(-(vectors @ q), args.top_k)[:args.top_k].tolist()) for q in queries]
+
+        modes = [("flat", lambda q: _search(client, "bench_chunks", q, args.top_k))]
+        modes += [(f"coarse={n}", lambda q, n=n: _two_stage(client, q, args.top_k, n)) for n in args.coarse]
+        for mode, fn in modes:
+            fn(queries[0].tolist())  # 预热
+            latencies, hit = [], 0
+            for q, expected in zip(queries, truth):
+                query = q.tolist()
+                t0 = time.perf_counter()
+                ids = fn(query)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                hit += len(expected & set(ids))
+            p50, p95 = _stats(latencies)
+            recall = hit / (args.top_k * len(queries))
+            print(f"{size:>10} {len(centroids):>7} {mode:>12} {p50:>8.2f} {p95:>8.2f} {recall:>9.3f}")
+
+    for name in ("bench_chunks", "bench_docs"):
+        client.drop_collection(name)
+
+
+if __name__ == "__main__":
+    main()
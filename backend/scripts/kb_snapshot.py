@@ -0,0 +1,56 @@
+"""知识库快照导出/导入：在 Milvus Lite 与 Milvus Standalone 之间迁移或从备份恢复，无需重新向量化
+
+用法（在 backend 目录下）：
+    python scripts/kb_snapshot.py export ./snapshot --uri ./milvus_data.db
+    # 沿用同一块存储（Lite → Standalone）：块存储中已有相同的块，只导入向量
+    python scripts/kb_snapshot.py import ./snapshot --uri http://localhost:19530
+    # 恢复到新的块存储：文本与向量一并导入
+    python scripts/kb_snapshot.py import ./snapshot --uri http://localhost:19530 --chunk-store ./restored.db
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="快照目录")
+    parser.add_argument("--uri", help="Milvus URI，默认读取配置中的 MILVUS_URI")
+    parser.add_argument("--chunk-store", help="块存储 SQLite 文件，默认读取配置中的 CHUNK_STORE_PATH")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="每批行数上限，默认按向量字节数（16MB/批）自动确定")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GRPC_VERBOSITY", "error")
+
+    from app.config import get_settings
+    from app.services.snapshot_service import export_snapshot, import_snapshot
+
+    # 不能通过 MILVUS_URI 环境变量传入：pymilvus 导入时会按它建立默认连接，本地文件路径在那里不合法。
+    # 各模块共享同一个 settings 对象，首次连接 Milvus / 块存储之前修改即可生效
+    settings = get_settings()
+    if args.uri:
+        settings.milvus_uri = args.uri
+    if args.chunk_store:
+        settings.chunk_store_path = args.chunk_store
+
+    start = time.perf_counter()
+
+    def progress(rows: int):
+        elapsed = time.perf_counter() - start
+        print(f"\r{rows} 行  {rows / max(elapsed, 1e-6):.0f} 行/秒", end="", flush=True)
+
+    if args.command == "export":
+        manifest = export_snapshot(args.path, args.batch_size, progress)
+        rows = manifest["rows"]
+    else:
+        rows = import_snapshot(args.path, args.batch_size, progress)
+    print(f"\n完成：{rows} 行，耗时 {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""启动耗时测量：启动 uvicorn 子进程，记录存活探针与就绪探针首次成功的时间
+
+用法（在 backend 目录下）：
+    python scripts/measure_startup.py --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def _probe(url: str) -> tuple[int, dict | None]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return 0, None
+
+
+def measure_once(port: int, timeout: float) -> dict:
+    base = f"http://127.0.0.1:{port}/api/health"
+    env = dict(os.environ, GRPC_VERBOSITY="error")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    result: dict = {"live": None, "ready": None, "steps": None}
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if result["live"] is None and _probe(f"{base}/live")[0] == 200:
+                result["live"] = time.perf_counter() - t0
+            if result["live"] is not None:
+                status, body = _probe(f"{base}/ready")
+                if status == 200:
+                    result["ready"] = time.perf_counter() - t0
+                    result["steps"] = body["warmup"]["step_seconds"]
+                    break
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    for i in range(args.runs):
+        r = measure_once(args.port, args.timeout)
+        live = f"{r['live']:.2f}s" if r["live"] is not None else "timeout"
+        ready = f"{r['ready']:.2f}s" if r["ready"] is not None else "timeout"
+        print(f"run {i + 1}: live={live} ready={ready} steps={r['steps']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""测试公共配置：在导入 app 模块（读取配置）之前，把所有本地存储路径指向临时目录"""
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="kb-tests-")
+os.environ["CHUNK_STORE_PATH"] = os.path.join(_tmp, "chunk_store.db")
+os.environ["SOFT_DELETE_FILE"] = os.path.join(_tmp, "soft_deleted.json")
+# MILVUS_URI 不能通过环境变量设置：pymilvus 导入时会按它建立默认连接，本地路径在那里不合法
+MILVUS_LITE_PATH = os.path.join(_tmp, "milvus.db")
+
+
+def random_vectors(n, seed=0, dim=8):
+    """(n, dim) 的 float32 随机向量，默认与 milvus fixture 的 8 维 collection 一致"""
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """每个测试使用独立的 chunk_store 数据库文件"""
+    from app.services import chunk_store
+
+    monkeypatch.setattr(chunk_store.settings, "chunk_store_path", str(tmp_path / "chunk_store.db"))
+    monkeypatch.setattr(chunk_store._local, "conn", None, raising=False)
+    yield chunk_store
+    conn = getattr(chunk_store._local, "conn", None)
+    if conn is not None:
+        conn.close()
+        chunk_store._local.conn = None
+
+
+@pytest.fixture
+def milvus(store, monkeypatch):
+    """Milvus Lite 上的独立 collection（8 维，通过同名别名访问），测试结束后删除"""
+    pytest.importorskip("milvus_lite")
+    import uuid
+
+    from app.services import milvus_service
+
+    name = f"t_{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(milvus_service.settings, "milvus_uri", MILVUS_LITE_PATH)
+    monkeypatch.setattr(milvus_service.settings, "collection_name", name)
+    monkeypatch.setattr(milvus_service.settings, "embedding_dim", 8)
+    monkeypatch.setattr(milvus_service.settings, "soft_delete_file", "")
+    monkeypatch.setattr(milvus_service, "_tag_supported", True)
+    monkeypatch.setattr(milvus_service, "_text_in_milvus", False)
+    monkeypatch.setattr(milvus_service, "_doc_collection", None)
+    monkeypatch.setattr(milvus_service, "_active", {})
+    monkeypatch.setattr(milvus_service, "_doc_index_builds", {})
+    milvus_service.init_collection()
+    yield milvus_service
+    for thread in list(milvus_service._doc_index_builds.values()):
+        thread.join(30)
+    client = milvus_service.get_milvus_client()
+    for collection in client.list_collections():
+        if collection.startswith(name):
+            client.drop_collection(collection)
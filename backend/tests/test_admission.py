@@ -0,0 +1,112 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import rag_service
+from app.services.admission_service import AdmissionRejected, Priority, ResourceLimiter
+
+
+def test_interactive_waiters_served_before_ingest():
+    async def run():
+        limiter = ResourceLimiter("test", capacity=1, max_queue=10)
+        await limiter.acquire(Priority.INTERACTIVE, 1)
+        order = []
+
+        async def waiter(name, priority):
+            await limiter.acquire(priority, 1)
+            order.append(name)
+            limiter.release()
+
+        tasks = [asyncio.create_task(waiter("ingest", Priority.INGEST))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(waiter("interactive", Priority.INTERACTIVE)))
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["interactive", "ingest"]
+    assert stats["in_use"] == 0 and stats["queued"] == 0 and stats["granted"] == 3
+
+
+def test_rejects_when_queue_full_or_wait_exceeded():
+    async def run():
+        limiter = ResourceLimiter("test", capacity=1, max_queue=1)
+        await limiter.acquire(Priority.INTERACTIVE, 1)
+        queued = asyncio.create_task(limiter.acquire(Priority.INGEST, 0.05))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire(Priority.INTERACTIVE, 1)
+        with pytest.raises(AdmissionRejected):
+            await queued
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(run())
+    assert stats["rejected"] == 1 and stats["timed_out"] == 1 and stats["in_use"] == 0
+
+
+class _FakeStream:
+    """模拟 GLM 流式响应：每 10ms 产出一个 token，记录产出数量与连接是否关闭"""
+
+    def __init__(self):
+        self.produced = 0
+        self.response = SimpleNamespace(closed=False)
+        self.response.close = lambda: setattr(self.response, "closed", True)
+
+    def __iter__(self):
+        for _ in range(1000):
+            time.sleep(0.01)
+            self.produced += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="x"))])
+
+
+def test_stream_worker_stops_before_slot_released(monkeypatch):
+    stream = _FakeStream()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **_: stream)))
+
+    async def no_results(*_):
+        return []
+
+    monkeypatch.setattr(rag_service, "get_client", lambda: client)
+    monkeypatch.setattr(rag_service, "_retrieve", no_results)
+    monkeypatch.setattr(rag_service.settings, "stream_flush_interval_ms", 0)
+
+    async def run():
+        exited = asyncio.Event()
+        released_at = {}
+
+        def on_exit():
+            released_at["produced"] = stream.produced
+            exited.set()
+
+        gen = rag_service.rag_chat_stream([{"role": "user", "content": "q"}], on_exit=on_exit)
+        await gen.__anext__()  # sources
+        await gen.__anext__()  # 第一个 token
+        await gen.aclose()  # 客户端断开
+        await asyncio.wait_for(exited.wait(), 2)
+        return released_at["produced"]
+
+    produced = asyncio.run(run())
+    assert stream.response.closed
+    assert produced == stream.produced < 20  # 名额归还时线程已退出，且没有继续生成到结束
+
+
+def test_on_exit_called_when_worker_never_started(monkeypatch):
+    async def failing(*_):
+        raise RuntimeError("检索失败")
+
+    monkeypatch.setattr(rag_service, "get_client", lambda: None)
+    monkeypatch.setattr(rag_service, "_retrieve", failing)
+    calls = []
+
+    async def run():
+        gen = rag_service.rag_chat_stream([{"role": "user", "content": "q"}], on_exit=lambda: calls.append(1))
+        with pytest.raises(RuntimeError):
+            await gen.__anext__()
+
+    asyncio.run(run())
+    assert calls == [1]
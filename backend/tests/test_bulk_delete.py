@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import maintenance_service
+from tests.conftest import random_vectors
+
+
+@pytest.fixture
+def client(milvus, monkeypatch):
+    monkeypatch.setattr(maintenance_service, "_history", [])
+    for n, name in enumerate(["report_1.pdf", "reports.pdf", "reportXfinal.pdf"]):
+        milvus.insert_chunks(f"d{n}", name, "pdf", [f"{name}-{i}" for i in range(n + 1)], random_vectors(n + 1, n))
+    # 不触发 lifespan（预热、定时 compaction），collection 已由 milvus fixture 初始化
+    return TestClient(app)
+
+
+def _listed(client):
+    return sorted(d["doc_id"] for d in client.get("/api/documents/list").json())
+
+
+def test_bulk_delete_by_pattern_counts_tombstones(client, milvus):
+    resp = client.post("/api/documents/bulk-delete", json={"name_pattern": "report_%"})
+    assert resp.status_code == 200
+    assert resp.json()["doc_ids"] == ["d0"] and resp.json()["deleted_rows"] == 1
+    assert _listed(client) == ["d1", "d2"]
+
+    resp = client.post("/api/documents/bulk-delete", json={"doc_ids": ["d2", "missing"]})
+    assert resp.json()["doc_ids"] == ["d2"] and resp.json()["deleted_rows"] == 3
+    assert milvus.get_tombstone_count() == 4
+    assert milvus.get_row_count() == 2
+    assert maintenance_service.tombstone_ratio() == pytest.approx(4 / 6)
+
+
+def test_bulk_delete_by_age_and_rejected_conditions(client, milvus, store):
+    store._connect().execute("UPDATE documents SET created_at = '2020-01-01T00:00:00' WHERE doc_id = 'd1'")
+    resp = client.post("/api/documents/bulk-delete", json={"older_than_days": 30})
+    assert resp.json()["doc_ids"] == ["d1"]
+    assert _listed(client) == ["d0", "d2"]
+
+    assert client.post("/api/documents/bulk-delete", json={"older_than_days": 0}).status_code == 422
+    assert client.post("/api/documents/bulk-delete", json={}).status_code == 400
+    assert client.post("/api/documents/bulk-delete", json={"name_pattern": "nothing%"}).json()["doc_ids"] == []
+
+
+def test_soft_bulk_delete_purged_by_compaction(client, milvus):
+    resp = client.post("/api/documents/bulk-delete", json={"doc_ids": ["d1", "d2"], "soft": True})
+    assert resp.json()["deleted_rows"] == 0
+    assert _listed(client) == ["d0"]
+    assert milvus.get_row_count() == 6 and milvus.get_tombstone_count() == 0
+
+    record = client.post("/api/documents/maintenance/compaction").json()
+    assert record["purged_rows"] == 5 and record["tombstone_ratio"] == pytest.approx(5 / 6, abs=1e-4)
+    assert milvus.get_soft_deleted_ids() == set() and milvus.get_row_count() == 1
+    assert milvus.get_tombstone_count() == 0
+
+    status = client.get("/api/documents/maintenance/compaction").json()
+    assert status["tombstones"] == 0 and status["history"] == [record]
+
+
+def test_scheduler_compacts_only_above_threshold(monkeypatch):
+    ratios = [0.1, 0.5, 0.1]
+    runs = []
+
+    async def fake_run_compaction():
+        runs.append(len(runs))
+
+    monkeypatch.setattr(maintenance_service.settings, "compaction_tombstone_ratio", 0.2)
+    monkeypatch.setattr(maintenance_service, "tombstone_ratio", lambda: ratios.pop(0) if ratios else 0.0)
+    monkeypatch.setattr(maintenance_service, "run_compaction", fake_run_compaction)
+
+    async def run():
+        task = asyncio.create_task(maintenance_service.compaction_scheduler(interval=0.01))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert runs == [0]
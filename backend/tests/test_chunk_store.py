@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+
+from app.services import rag_service
+
+
+def _rows(doc_id, ids, name="doc.txt", start=0):
+    return [
+        {"id": i, "doc_id": doc_id, "chunk_index": start + n, "content": f"{doc_id}-{n} 中文内容",
+         "doc_name": name, "doc_type": "txt", "tag": "t", "created_at": "2026-01-01T00:00:00"}
+        for n, i in enumerate(ids)
+    ]
+
+
+def test_chunks_round_trip(store):
+    assert store.put_chunks(_rows("a", [1, 2, 3])) == 3
+    chunks = store.get_chunks([3, 1, 99])
+    assert sorted(chunks) == [1, 3]
+    assert chunks[1] == {"id": 1, "doc_id": "a", "chunk_index": 0, "content": "a-0 中文内容", "doc_name": "doc.txt"}
+    assert [c["chunk_index"] for c in store.get_chunk_range("a", 1, 5)] == [1, 2]
+    assert [c["chunk_index"] for batch in store.iter_chunks("a", 2) for c in batch] == [0, 1, 2]
+    assert store.count_chunks("a") == 3
+    assert store.get_document("a")["tag"] == "t"
+    assert store.delete_documents(["a"]) == 3
+    assert store.get_chunks([1, 2, 3]) == {} and store.get_document("a") is None
+
+
+def test_existing_id_rejected_unless_ignored(store):
+    store.put_chunks(_rows("a", [1, 2]))
+    with pytest.raises(sqlite3.IntegrityError):
+        store.put_chunks(_rows("b", [2, 3]))
+    assert store.get_document("b") is None and store.get_chunks([3]) == {}  # 整批回滚
+    assert store.get_chunks([2])[2]["doc_id"] == "a"
+
+    assert store.put_chunks(_rows("b", [2, 3]), ignore_existing=True) == 2
+    assert store.get_chunks([2])[2]["doc_id"] == "a"
+    assert store.get_chunks([3])[3]["doc_id"] == "b"
+
+
+def test_allocated_ids_skip_external_ids(store):
+    assert store.allocate_ids(2) == [1, 2]
+    store.put_chunks(_rows("a", [10, 11]))
+    assert store.allocate_ids(1) == [12]
+
+
+def test_find_document_ids_batches_and_matches_case(store):
+    for n in range(store.QUERY_BATCH + 20):
+        store.put_chunks(_rows(f"d{n}", [n + 1], name=f"Report-{n}.txt" if n % 2 else f"report-{n}.txt"))
+    wanted = [f"d{n}" for n in range(store.QUERY_BATCH + 20)] + ["missing"]
+    assert len(store.find_document_ids(wanted)) == store.QUERY_BATCH + 20
+    found = store.find_document_ids(wanted, name_pattern="Report-%")
+    assert found and all(int(doc_id[1:]) % 2 for doc_id in found)
+    assert store.find_document_ids(name_pattern="REPORT-%") == []
+    with pytest.raises(ValueError):
+        store.find_document_ids()
+
+
+def test_neighbors_include_each_chunk_once(store):
+    store.put_chunks(_rows("a", [1, 2, 3, 4, 5]))
+    results = [
+        {"doc_id": "a", "chunk_index": 1, "doc_name": "doc.txt", "content": "a-1 中文内容"},
+        {"doc_id": "a", "chunk_index": 2, "doc_name": "doc.txt", "content": "a-2 中文内容"},
+        {"doc_id": "a", "chunk_index": 4, "doc_name": "doc.txt", "content": "a-4 中文内容"},
+    ]
+    rag_service._attach_neighbors(results, 1)
+    assert results[0]["context"].split("\n") == ["a-0 中文内容", "a-1 中文内容", "a-2 中文内容"]
+    assert results[1]["context"] == "a-3 中文内容"
+    assert results[2]["context"] == "a-4 中文内容"
+
+    context = rag_service._build_context(results)
+    assert all(context.count(f"a-{n} 中文内容") == 1 for n in range(5))
+
+
+def test_name_pattern_only_percent_is_wildcard(store):
+    for n, name in enumerate(["report_1.pdf", "reports.pdf", "reportXfinal.pdf", "report\\_x.pdf"]):
+        store.put_chunks(_rows(f"d{n}", [n + 1], name=name))
+    assert store.find_document_ids(name_pattern="report_%") == ["d0"]
+    assert store.find_document_ids(name_pattern="report\\_%") == ["d3"]
+    assert sorted(store.find_document_ids(name_pattern="report%")) == ["d0", "d1", "d2", "d3"]
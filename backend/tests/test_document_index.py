@@ -0,0 +1,99 @@
+import numpy as np
+
+from tests.conftest import random_vectors
+
+
+def _expected_centroid(vectors):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    mean = unit.sum(axis=0)
+    return mean / np.linalg.norm(mean)
+
+
+def _doc_vectors(milvus):
+    rows = milvus.get_milvus_client().query(
+        collection_name=milvus._doc_collection, filter='doc_id != ""', output_fields=["doc_id", "embedding"],
+    )
+    return {row["doc_id"]: np.asarray(row["embedding"]) for row in rows}
+
+
+def _wait_for_builds(milvus):
+    for thread in list(milvus._doc_index_builds.values()):
+        thread.join(30)
+
+
+def test_insert_accumulates_centroid_across_insert_batches(milvus, monkeypatch):
+    monkeypatch.setattr(milvus.settings, "insert_batch_size", 2)
+    v = random_vectors(5, 3)
+    milvus.insert_chunks("a", "a.txt", "txt", [f"a{i}" for i in range(5)], v)
+    np.testing.assert_allclose(_doc_vectors(milvus)["a"], _expected_centroid(v), atol=1e-5)
+
+
+def test_build_accumulates_across_iterator_batches(milvus, monkeypatch):
+    vectors = {doc_id: random_vectors(n, seed) for seed, (doc_id, n) in enumerate([("a", 7), ("b", 1), ("c", 12)])}
+    for doc_id, v in vectors.items():
+        milvus.insert_chunks(doc_id, f"{doc_id}.txt", "txt", [f"{doc_id}{i}" for i in range(len(v))], v)
+    monkeypatch.setattr(milvus, "DOC_INDEX_BATCH", 2)
+    monkeypatch.setattr(milvus, "DOC_INDEX_QUERY_ROWS", 3)
+
+    assert milvus.build_document_index() == 3
+    built = _doc_vectors(milvus)
+    for doc_id, v in vectors.items():
+        np.testing.assert_allclose(built[doc_id], _expected_centroid(v), atol=1e-5)
+
+
+def test_missing_index_built_in_background_then_two_stage_enabled(milvus, monkeypatch):
+    milvus.insert_chunks("a", "a.txt", "txt", ["a0", "a1"], random_vectors(2, 1) + 5)
+    milvus.insert_chunks("b", "b.txt", "txt", ["b0", "b1"], random_vectors(2, 2) - 5)
+    physical = milvus.resolve_collection()
+    # 模拟旧版 collection：没有文档级向量与就绪标记
+    milvus.get_milvus_client().drop_collection(milvus.document_collection_name(physical))
+    milvus.chunk_store.set_meta(milvus._doc_index_key(physical), "")
+    monkeypatch.setattr(milvus.settings, "coarse_top_docs", 1)
+
+    milvus.init_collection()
+    _wait_for_builds(milvus)
+    assert milvus.is_document_index_ready()
+    assert set(_doc_vectors(milvus)) == {"a", "b"}
+    hits = milvus.search_similar((np.ones(8) * 5).tolist(), top_k=4)
+    assert {h["doc_id"] for h in hits} == {"a"}
+
+
+def test_drop_flag_on_legacy_collection_leaves_no_document_collection(milvus, monkeypatch):
+    legacy = milvus.settings.collection_name + "_old"
+    monkeypatch.setattr(milvus.settings, "collection_name", legacy)
+    milvus.create_collection(legacy, 8, milvus.settings.embedding_model, "zhipu")
+    monkeypatch.setattr(milvus.settings, "embedding_dim", 16)
+    monkeypatch.setattr(milvus.settings, "drop_collection_on_dim_change", True)
+
+    milvus.init_collection()
+    _wait_for_builds(milvus)
+    names = set(milvus.get_milvus_client().list_collections())
+    physical = milvus.resolve_collection()
+    assert {n for n in names if n.startswith(legacy)} == {physical, milvus.document_collection_name(physical)}
+
+
+def test_build_skips_documents_deleted_from_chunk_store(milvus, store):
+    milvus.insert_chunks("a", "a.txt", "txt", ["a0"], random_vectors(1, 1))
+    milvus.insert_chunks("b", "b.txt", "txt", ["b0"], random_vectors(1, 2))
+    client = milvus.get_milvus_client()
+    client.delete(collection_name=milvus._doc_collection, filter='doc_id != ""')
+    store.delete_documents(["b"])  # 删除进行到一半：chunk_store 已删除，块向量仍在
+
+    assert milvus.build_document_index(doc_ids=["a", "b"]) == 1
+    assert set(_doc_vectors(milvus)) == {"a"}
+
+
+def test_build_removes_document_deleted_during_upsert(milvus, store, monkeypatch):
+    milvus.insert_chunks("a", "a.txt", "txt", ["a0"], random_vectors(1, 1))
+    milvus.insert_chunks("b", "b.txt", "txt", ["b0"], random_vectors(1, 2))
+    client = milvus.get_milvus_client()
+    real_upsert = client.upsert
+
+    def upsert_then_delete(**kwargs):
+        result = real_upsert(**kwargs)
+        store.delete_documents(["b"])  # 并发删除在文档级向量写入后清掉了 chunk_store
+        return result
+
+    monkeypatch.setattr(client, "upsert", upsert_then_delete)
+    assert milvus.build_document_index() == 1
+    assert set(_doc_vectors(milvus)) == {"a"}
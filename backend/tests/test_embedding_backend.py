@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.services import embedding_service
+
+
+@pytest.fixture(autouse=True)
+def fresh_backends(monkeypatch):
+    monkeypatch.setattr(embedding_service, "_backends", {})
+
+
+class _FakeLocal:
+    kind = "local"
+    request_batch_size = 64
+
+    def __init__(self, model_name, **_):
+        self.model_name = model_name
+        self.dim = 384
+
+
+def test_default_backend_follows_collection_record(milvus, monkeypatch):
+    monkeypatch.setattr(milvus.settings, "embedding_model", "configured-model")
+    backend = embedding_service.get_backend()
+    assert (backend.kind, backend.model_name, backend.dim) == ("zhipu", "embedding-3", 8)
+    assert embedding_service.get_backend() is backend
+
+
+def test_recorded_model_kept_when_config_differs(milvus, monkeypatch):
+    monkeypatch.setattr(milvus.settings, "embedding_backend", "local")
+    monkeypatch.setattr(embedding_service, "LocalEmbeddingBackend", _FakeLocal)
+    milvus.init_collection()
+    assert milvus.get_active_embedding() == {"backend": "zhipu", "model": "embedding-3", "dim": 8}
+    assert (milvus.settings.embedding_model, milvus.settings.embedding_dim) == ("embedding-3", 8)
+
+
+def test_local_backend_dim_mismatch_rejected_without_touching_settings(monkeypatch):
+    monkeypatch.setattr(embedding_service, "LocalEmbeddingBackend", _FakeLocal)
+    before = (embedding_service.settings.embedding_model, embedding_service.settings.embedding_dim)
+    with pytest.raises(ValueError):
+        embedding_service.get_backend("local", "bge", 512)
+    assert embedding_service.get_backend("local", "bge", 384).dim == 384
+    assert (embedding_service.settings.embedding_model, embedding_service.settings.embedding_dim) == before
+
+
+def test_zhipu_backend_requires_dim():
+    with pytest.raises(ValueError):
+        embedding_service.get_backend("zhipu", "embedding-3", None)
+    backend = embedding_service.get_backend("zhipu", "embedding-2", 1024)
+    assert (backend.model_name, backend.dim) == ("embedding-2", 1024)
+
+
+@pytest.fixture
+def local_backend():
+    """不加载模型的本地后端：_encode 记录每批输入，返回 [文本长度, 批内位置]"""
+    backend = object.__new__(embedding_service.LocalEmbeddingBackend)
+    backend._batch_chars = 100
+    backend._max_batch = 3
+    backend._executor = ThreadPoolExecutor(max_workers=2)
+    backend.dim = 2
+    backend.calls = []
+
+    def encode(texts):
+        backend.calls.append(list(texts))
+        return np.asarray([[len(t), i] for i, t in enumerate(texts)], dtype=np.float32)
+
+    backend._encode = encode
+    yield backend
+    backend._executor.shutdown()
+
+
+def test_plan_batches_groups_by_length_within_limits(local_backend):
+    texts = ["x" * n for n in (50, 5, 30, 10, 5, 40)]
+    assert local_backend._plan_batches(texts) == [[1, 4, 3], [2, 5], [0]]
+
+    # 超过字符上限的单条文本独占一批；短文本按 max_batch 截断
+    assert local_backend._plan_batches(["x" * 500, "x"]) == [[1], [0]]
+    assert [len(b) for b in local_backend._plan_batches(["x"] * 7)] == [3, 3, 1]
+
+
+def test_embed_restores_input_order(local_backend):
+    lengths = [50, 5, 30, 10, 6, 40, 1]
+    result = local_backend.embed(["x" * n for n in lengths])
+    assert result.dtype == np.float32 and result.shape == (7, 2)
+    assert result[:, 0].tolist() == lengths
+    # 各批在线程池中并行执行，完成顺序不定
+    assert sorted([len(t) for t in batch] for batch in local_backend.calls) == [[1, 5, 6], [10, 30], [40, 50]]
+
+
+def test_embed_empty_input_skips_encoding(local_backend):
+    assert local_backend.embed([]).shape == (0, 2)
+    assert local_backend.calls == []
@@ -0,0 +1,26 @@
+import pytest
+
+from tests.conftest import random_vectors
+
+
+def test_failed_insert_rolls_back_partial_document(milvus, store, monkeypatch):
+    milvus.insert_chunks("keep", "keep.txt", "txt", ["k0"], random_vectors(1))
+    monkeypatch.setattr(milvus.settings, "insert_batch_size", 2)
+    real_put = store.put_chunks
+    calls = []
+
+    def failing_put(rows):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("磁盘已满")
+        return real_put(rows)
+
+    monkeypatch.setattr(store, "put_chunks", failing_put)
+    with pytest.raises(RuntimeError, match="磁盘已满"):
+        milvus.insert_chunks("doc", "doc.txt", "txt", [f"c{i}" for i in range(5)], random_vectors(5, 1))
+
+    assert [d["doc_id"] for d in milvus.list_documents()] == ["keep"]
+    assert milvus.get_row_count() == 1
+    client = milvus.get_milvus_client()
+    docs = client.query(collection_name=milvus._doc_collection, filter='doc_id != ""', output_fields=["doc_id"])
+    assert [d["doc_id"] for d in docs] == ["keep"]
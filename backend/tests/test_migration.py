@@ -0,0 +1,110 @@
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import migration_service
+from tests.conftest import random_vectors
+
+
+def test_diff_documents_compares_chunk_counts():
+    expected = {"a": 3, "b": 2, "c": 1}
+    copied = Counter({"a": 3, "b": 1, "gone": 4})
+    assert migration_service.diff_documents(expected, copied) == (["b", "c"], ["gone"])
+
+
+def test_service_name_is_an_alias(milvus):
+    alias = milvus.settings.collection_name
+    physical = milvus.resolve_collection()
+    assert physical != alias and physical.startswith(alias)
+    assert milvus.get_active_embedding() == {"backend": "zhipu", "model": milvus.settings.embedding_model, "dim": 8}
+
+
+def test_legacy_collection_adopted_by_rename(milvus, monkeypatch):
+    legacy = milvus.settings.collection_name + "_old"
+    monkeypatch.setattr(milvus.settings, "collection_name", legacy)
+    milvus.create_collection(legacy, 8, milvus.settings.embedding_model, "zhipu")
+    milvus.get_milvus_client().insert(collection_name=legacy, data=[
+        {"id": 1, "doc_id": "d", "tag": "", "embedding": [1.0] + [0.0] * 7},
+    ])
+
+    milvus.init_collection()
+    assert milvus.resolve_collection() == f"{legacy}_v0"
+    assert milvus.get_milvus_client().has_collection(milvus.document_collection_name(f"{legacy}_v0"))
+    assert milvus.get_row_count() == 1
+
+
+def test_dim_change_with_drop_flag_replaces_aliased_collection(milvus, monkeypatch):
+    milvus.insert_chunks("d", "d.txt", "txt", ["x"], random_vectors(1))
+    previous = milvus.resolve_collection()
+    monkeypatch.setattr(milvus.settings, "embedding_dim", 16)
+    monkeypatch.setattr(milvus.settings, "drop_collection_on_dim_change", True)
+
+    milvus.init_collection()
+    assert milvus.resolve_collection() != previous
+    assert not milvus.get_milvus_client().has_collection(previous)
+    assert milvus.get_active_embedding()["dim"] == 16
+    assert milvus.get_row_count() == 0 and milvus.list_documents() == []
+
+
+def test_dim_change_keeps_recorded_model_without_drop_flag(milvus, monkeypatch):
+    monkeypatch.setattr(milvus.settings, "embedding_dim", 16)
+    milvus.init_collection()
+    assert milvus.get_active_embedding()["dim"] == 8
+    assert milvus.settings.embedding_dim == 16  # 不回写 settings
+
+
+def test_alias_switch_seen_through_generation(milvus):
+    target = milvus.new_collection_name("other-model", 16) + "_b"
+    milvus.create_collection(target, 16, "other-model", "local")
+    # 模拟其他进程完成切换：只改别名与切换代数，本进程的 _active 尚未刷新
+    milvus.get_milvus_client().alter_alias(collection_name=target, alias=milvus.settings.collection_name)
+    milvus.chunk_store.add_meta_int(milvus.GENERATION_KEY, 1)
+
+    assert milvus.get_active_embedding() == {"backend": "local", "model": "other-model", "dim": 16}
+    with pytest.raises(milvus.WritesPausedError):
+        milvus.insert_chunks("d", "d.txt", "txt", ["x"], random_vectors(1), embedding_model=milvus.settings.embedding_model)
+    milvus.insert_chunks("d", "d.txt", "txt", ["x"], random_vectors(1, dim=16), embedding_model="other-model")
+    assert milvus.get_row_count() == 1
+
+
+def test_writes_blocked_while_paused(milvus, monkeypatch):
+    monkeypatch.setattr(milvus.settings, "write_fence_timeout", 0.2)
+    assert milvus.pause_writes(1)
+    try:
+        with pytest.raises(milvus.WritesPausedError):
+            milvus.insert_chunks("d", "d.txt", "txt", ["x"], random_vectors(1))
+        with pytest.raises(milvus.WritesPausedError):
+            milvus.delete_documents(["d"])
+    finally:
+        milvus.resume_writes()
+    assert milvus.insert_chunks("d", "d.txt", "txt", ["x"], random_vectors(1)) == 1
+
+
+def test_migration_switches_alias_and_drops_source(milvus, monkeypatch):
+    milvus.insert_chunks("a", "a.txt", "txt", ["a0", "a1", "a2"], random_vectors(3, seed=1))
+    milvus.insert_chunks("b", "b.txt", "txt", ["b0"], random_vectors(1, seed=2))
+    source = milvus.resolve_collection()
+
+    def embed(texts):
+        # 复制阶段之后、切换之前：删除 b 并新上传 c，验证补齐阶段的差异处理
+        if texts == ["a0", "a1", "a2", "b0"]:
+            milvus.delete_documents(["b"])
+            milvus.insert_chunks("c", "c.txt", "txt", ["c0", "c1"], random_vectors(2, seed=3))
+        return random_vectors(len(texts), dim=16)
+
+    backend = SimpleNamespace(kind="zhipu", model_name="new-model", dim=16, embed=embed)
+    monkeypatch.setattr(migration_service.settings, "write_fence_grace", 0)
+    monkeypatch.setattr(migration_service.settings, "migration_drop_delay", 0)
+    monkeypatch.setitem(migration_service._state, "source", source)
+
+    migration_service._run(backend, rate=1e9)
+    state = migration_service.get_migration_state()
+    assert state["status"] == "completed", state["error"]
+    assert milvus.resolve_collection() == state["target"]
+    assert not milvus.get_milvus_client().has_collection(source)
+    assert milvus.get_active_embedding() == {"backend": "zhipu", "model": "new-model", "dim": 16}
+    assert milvus.get_row_count() == 5
+    assert sorted(d["doc_id"] for d in milvus.list_documents()) == ["a", "c"]
+    hits = milvus.search_similar(random_vectors(1, dim=16)[0].tolist(), top_k=10)
+    assert {h["doc_id"] for h in hits} == {"a", "c"}
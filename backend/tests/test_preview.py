@@ -0,0 +1,41 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers import documents
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    rows = [
+        {"id": i + 1, "doc_id": "doc", "chunk_index": i, "content": f"chunk {i}",
+         "doc_name": "a.txt", "doc_type": "txt"}
+        for i in range(7)
+    ]
+    store.put_chunks(rows)
+    monkeypatch.setattr(documents, "PREVIEW_STREAM_BATCH", 3)
+    # 不触发 lifespan（连接 Milvus、预热），预览只读 chunk_store
+    return TestClient(app)
+
+
+def test_preview_cursor_pages(client):
+    seen, after = [], -1
+    while after is not None:
+        body = client.get("/api/documents/doc/preview", params={"after": after, "limit": 3}).json()
+        seen += [c["chunk_index"] for c in body["chunks"]]
+        after = body["next_cursor"]
+    assert seen == list(range(7))
+
+
+def test_preview_stream_ndjson(client):
+    resp = client.get("/api/documents/doc/preview", params={"stream": True})
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert lines[0]["type"] == "meta" and lines[0]["chunk_count"] == 7
+    assert [line["chunk_index"] for line in lines[1:-1]] == list(range(7))
+    assert lines[-1] == {"type": "done"}
+
+
+def test_preview_missing_document(client):
+    assert client.get("/api/documents/missing/preview").status_code == 404
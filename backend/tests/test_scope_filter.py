@@ -0,0 +1,54 @@
+import pytest
+from pydantic import ValidationError
+
+from app.config import Settings
+from app.services import milvus_service
+from app.services.milvus_service import _quote, build_scope_filter
+
+
+def test_quote_escapes_quotes_and_backslashes():
+    assert _quote('a"b') == '"a\\"b"'
+    assert _quote("a\\b") == '"a\\\\b"'
+    assert _quote('x" or doc_id != "') == '"x\\" or doc_id != \\""'
+
+
+def test_scope_filter_empty_means_whole_library():
+    assert build_scope_filter() == ""
+    assert build_scope_filter(doc_ids=[]) == ""
+
+
+def test_scope_filter_single_and_multiple_documents():
+    assert build_scope_filter(doc_id="d1") == 'doc_id == "d1"'
+    assert build_scope_filter(doc_ids=["d1", "d2"]) == 'doc_id in ["d1", "d2"]'
+    # doc_id 与 doc_ids 合并且去重
+    assert build_scope_filter(doc_id="d1", doc_ids=["d1"]) == 'doc_id == "d1"'
+    assert build_scope_filter(doc_id="d3", doc_ids=["d1"]) == 'doc_id in ["d1", "d3"]'
+
+
+def test_scope_filter_with_tag(monkeypatch):
+    monkeypatch.setattr(milvus_service, "_tag_supported", True)
+    assert build_scope_filter(doc_ids=["d1"], tag="team-a") == 'doc_id == "d1" and tag == "team-a"'
+    assert build_scope_filter(tag='a"b') == 'tag == "a\\"b"'
+
+
+def test_scope_filter_tag_on_legacy_collection(monkeypatch):
+    monkeypatch.setattr(milvus_service, "_tag_supported", False)
+    with pytest.raises(ValueError):
+        build_scope_filter(tag="team-a")
+
+
+@pytest.mark.parametrize("field", ["", "doc_id", "tag"])
+def test_partition_key_field_accepts_scalar_fields(field):
+    assert Settings(partition_key_field=field).partition_key_field == field
+
+
+@pytest.mark.parametrize("field", ["content", "embedding", "doc_name"])
+def test_partition_key_field_rejects_unknown_fields(field):
+    with pytest.raises(ValidationError):
+        Settings(partition_key_field=field)
+
+
+@pytest.mark.parametrize("value", [0, 1025])
+def test_num_partitions_range(value):
+    with pytest.raises(ValidationError):
+        Settings(num_partitions=value)
@@ -0,0 +1,113 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.services import snapshot_service
+from tests.conftest import random_vectors
+
+
+def test_rows_per_batch_bounded_by_bytes():
+    assert snapshot_service._rows_per_batch(2048, None) * 2048 * 4 <= snapshot_service.MAX_BATCH_BYTES
+    assert snapshot_service._rows_per_batch(2048, 100) == 100
+    assert snapshot_service._rows_per_batch(1024, None) == snapshot_service.MAX_BATCH_BYTES // 4096
+    assert snapshot_service._rows_per_batch(8, None) == snapshot_service.MAX_BATCH_ROWS
+
+
+def test_snapshot_round_trip_into_empty_target(milvus, store, tmp_path, monkeypatch):
+    milvus.insert_chunks("doc_a", "a.txt", "txt", ["a0", "a1", "a2"], random_vectors(3, 1))
+    milvus.insert_chunks("doc_b", "b.txt", "txt", ["b0", "b1"], random_vectors(2, 2), tag="team")
+    milvus.soft_delete_documents(["doc_b"])
+    manifest = snapshot_service.export_snapshot(str(tmp_path / "snap"), batch_size=2)
+    assert manifest["rows"] == 5 and manifest["soft_deleted"] == ["doc_b"]
+
+    # 导入非空知识库被拒绝
+    with pytest.raises(ValueError):
+        snapshot_service.import_snapshot(str(tmp_path / "snap"))
+
+    # 换一个空的 collection 与块存储作为目标
+    monkeypatch.setattr(milvus.settings, "collection_name", milvus.settings.collection_name + "_copy")
+    monkeypatch.setattr(store.settings, "chunk_store_path", str(tmp_path / "target.db"))
+    store._local.conn.close()
+    store._local.conn = None
+    milvus.init_collection()
+
+    assert snapshot_service.import_snapshot(str(tmp_path / "snap"), batch_size=2) == 5
+    assert milvus.get_row_count() == 5
+    assert [c["content"] for c in milvus.get_document_chunks("doc_a")] == ["a0", "a1", "a2"]
+    assert milvus.get_soft_deleted_ids() == {"doc_b"}
+    assert store.get_document("doc_b")["tag"] == "team"
+
+    # 重复导入同样被拒绝
+    with pytest.raises(ValueError):
+        snapshot_service.import_snapshot(str(tmp_path / "snap"))
+
+
+def test_snapshot_version_mismatch_rejected(tmp_path):
+    (tmp_path / "manifest.json").write_text(json.dumps({"version": 1}), encoding="utf-8")
+    with pytest.raises(ValueError, match="快照版本"):
+        snapshot_service.import_snapshot(str(tmp_path))
+
+
+def _switch_collection(milvus):
+    """切换到新的空 collection 作为导入目标（沿用同一块存储；配置由 fixture 的 monkeypatch 还原）"""
+    milvus.settings.collection_name += "_copy"
+    milvus.init_collection()
+
+
+def test_vectors_only_import_reuses_matching_chunk_store(milvus, store, tmp_path, monkeypatch):
+    milvus.insert_chunks("doc_a", "a.txt", "txt", ["a0", "a1", "a2"], random_vectors(3, 1))
+    snapshot_service.export_snapshot(str(tmp_path / "snap"), batch_size=2)
+
+    _switch_collection(milvus)
+    put_calls = []
+    monkeypatch.setattr(store, "put_chunks", lambda rows: put_calls.append(rows))
+    assert snapshot_service.import_snapshot(str(tmp_path / "snap"), batch_size=2) == 3
+    assert put_calls == [] and store.count_all_chunks() == 3
+    assert milvus.get_row_count() == 3
+    hits = milvus.search_similar(random_vectors(3, 1)[1], top_k=1)
+    assert hits[0]["content"] == "a1"
+
+
+def test_import_rejects_chunk_store_with_other_data(milvus, store, tmp_path):
+    milvus.insert_chunks("doc_a", "a.txt", "txt", ["a0", "a1"], random_vectors(2, 1))
+    snapshot_service.export_snapshot(str(tmp_path / "snap"))
+
+    _switch_collection(milvus)
+    store.put_chunks([{"id": 99, "doc_id": "other", "chunk_index": 0, "content": "x", "doc_name": "o.txt"}])
+    with pytest.raises(ValueError, match="不一致"):
+        snapshot_service.import_snapshot(str(tmp_path / "snap"))
+    assert milvus.get_row_count() == 0
+
+
+def test_export_leaves_legacy_collection_untouched(milvus, store, tmp_path, monkeypatch):
+    legacy = milvus.settings.collection_name + "_old"
+    monkeypatch.setattr(milvus.settings, "collection_name", legacy)
+    monkeypatch.setattr(milvus, "_active", {})
+    milvus.create_collection(legacy, 8, milvus.settings.embedding_model, "zhipu")
+    milvus.get_milvus_client().insert(collection_name=legacy, data=[
+        {"id": 1, "doc_id": "d", "tag": "", "embedding": [1.0] + [0.0] * 7},
+    ])
+    store.put_chunks([{"id": 1, "doc_id": "d", "chunk_index": 0, "content": "x", "doc_name": "d.txt"}])
+
+    assert snapshot_service.export_snapshot(str(tmp_path / "snap"))["rows"] == 1
+    client = milvus.get_milvus_client()
+    assert milvus.resolve_collection() == legacy and not client.has_collection(f"{legacy}_v0")
+    assert milvus._doc_index_builds == {} and not milvus.is_document_index_ready(legacy)
+
+
+def test_cli_imports_into_local_milvus_and_chunk_store(milvus, store, tmp_path):
+    milvus.insert_chunks("doc_a", "a.txt", "txt", ["a0", "a1"], random_vectors(2, 1))
+    snapshot_service.export_snapshot(str(tmp_path / "snap"))
+    script = os.path.join(os.path.dirname(__file__), "..", "scripts", "kb_snapshot.py")
+    env = {**os.environ, "COLLECTION_NAME": milvus.settings.collection_name, "EMBEDDING_DIM": "8"}
+
+    result = subprocess.run(
+        [sys.executable, script, "import", str(tmp_path / "snap"),
+         "--uri", str(tmp_path / "other.db"), "--chunk-store", str(tmp_path / "other_store.db")],
+        env=env, capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "完成：2 行" in result.stdout
@@ -0,0 +1,59 @@
+import json
+
+from app.services import milvus_service
+
+
+def _put_doc(store, doc_id, first_id):
+    store.put_chunks([{"id": first_id, "doc_id": doc_id, "chunk_index": 0, "content": "x", "doc_name": doc_id}])
+
+
+def _reopen(store):
+    """模拟进程重启：丢弃当前线程的连接，下次访问重新打开同一数据库文件"""
+    store._local.conn.close()
+    store._local.conn = None
+
+
+def test_soft_delete_registry_survives_restart(store):
+    assert milvus_service.soft_delete_documents(["a", "b"]) == 2
+    _reopen(store)
+    assert milvus_service.get_soft_deleted_ids() == {"a", "b"}
+    assert milvus_service.restore_documents(["a", "missing"]) == 1
+    _reopen(store)
+    assert milvus_service.get_soft_deleted_ids() == {"b"}
+
+
+def test_soft_deleted_documents_hidden_from_listing(store):
+    _put_doc(store, "a", 1)
+    _put_doc(store, "b", 2)
+    milvus_service.soft_delete_documents(["a"])
+    assert [d["doc_id"] for d in milvus_service.list_documents()] == ["b"]
+    assert not milvus_service.document_exists("a")
+    assert milvus_service.document_exists("a", include_soft_deleted=True)
+
+
+def test_physical_delete_clears_registry(store):
+    _put_doc(store, "a", 1)
+    milvus_service.soft_delete_documents(["a"])
+    store.delete_documents(["a"])
+    assert milvus_service.get_soft_deleted_ids() == set()
+
+
+def test_tombstone_counter_is_persistent(store):
+    assert milvus_service.get_tombstone_count() == 0
+    store.add_meta_int(milvus_service.TOMBSTONES_KEY, 5)
+    store.add_meta_int(milvus_service.TOMBSTONES_KEY, 3)
+    _reopen(store)
+    assert milvus_service.get_tombstone_count() == 8
+    store.add_meta_int(milvus_service.TOMBSTONES_KEY, -5)
+    assert milvus_service.get_tombstone_count() == 3
+
+
+def test_legacy_soft_delete_file_imported_once(store, tmp_path, monkeypatch):
+    path = tmp_path / "soft_deleted.json"
+    path.write_text(json.dumps(["x", "y"]), encoding="utf-8")
+    monkeypatch.setattr(milvus_service.settings, "soft_delete_file", str(path))
+    milvus_service.import_soft_delete_file()
+    assert milvus_service.get_soft_deleted_ids() == {"x", "y"}
+    assert not path.exists()
+    milvus_service.import_soft_delete_file()  # 文件已改名，不会重复导入
+    assert milvus_service.get_soft_deleted_ids() == {"x", "y"}
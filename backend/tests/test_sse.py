@@ -0,0 +1,83 @@
+import asyncio
+import json
+import zlib
+
+import pytest
+
+from app.utils.sse import coalesce_deltas, encode_event, gzip_stream
+
+
+async def _collect(items, interval, chars):
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    return [text async for text in coalesce_deltas(queue, interval, chars)]
+
+
+def test_encode_event_keeps_unicode():
+    frame = encode_event({"type": "content", "content": "知识库"})
+    assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+    assert json.loads(frame[6:-2].decode("utf-8")) == {"type": "content", "content": "知识库"}
+
+
+def test_coalesce_flushes_on_char_threshold():
+    out = asyncio.run(_collect(["ab", "cd", "ef", "g", None], 10.0, 4))
+    assert out == ["abcd", "efg"]
+
+
+def test_coalesce_disabled_passes_deltas_through():
+    out = asyncio.run(_collect(["a", "b", None], 0, 100))
+    assert out == ["a", "b"]
+
+
+def test_coalesce_flushes_on_interval():
+    async def run():
+        queue: asyncio.Queue = asyncio.Queue()
+        out = []
+
+        async def consume():
+            async for text in coalesce_deltas(queue, 0.02, 1000):
+                out.append(text)
+
+        task = asyncio.create_task(consume())
+        queue.put_nowait("a")
+        queue.put_nowait("b")
+        await asyncio.sleep(0.08)
+        snapshot = list(out)  # 时间窗口到期后已刷新，无需等待结束哨兵
+        queue.put_nowait("c")
+        queue.put_nowait(None)
+        await task
+        return snapshot, out
+
+    snapshot, out = asyncio.run(run())
+    assert snapshot == ["ab"]
+    assert out == ["ab", "c"]
+
+
+def test_coalesce_emits_buffer_before_error():
+    async def run():
+        out = []
+        with pytest.raises(RuntimeError):
+            queue: asyncio.Queue = asyncio.Queue()
+            for item in ["a", "b", RuntimeError("boom")]:
+                queue.put_nowait(item)
+            async for text in coalesce_deltas(queue, 10.0, 100):
+                out.append(text)
+        return out
+
+    assert asyncio.run(run()) == ["ab"]
+
+
+def test_gzip_stream_frames_decodable_incrementally():
+    async def frames():
+        yield encode_event({"content": "a"})
+        yield "data: {}\n\n"
+
+    async def run():
+        return [chunk async for chunk in gzip_stream(frames())]
+
+    chunks = asyncio.run(run())
+    decoder = zlib.decompressobj(31)
+    # 每帧 SYNC_FLUSH 后即可解出完整的帧
+    assert decoder.decompress(chunks[0]) == encode_event({"content": "a"})
+    assert decoder.decompress(b"".join(chunks[1:])) == b"data: {}\n\n"
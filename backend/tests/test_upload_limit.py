@@ -0,0 +1,81 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.middleware import MULTIPART_OVERHEAD, UploadSizeLimitMiddleware
+
+LIMIT = 1024
+
+
+def _make_client():
+    app = FastAPI()
+    parsed = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        parsed.append(file.filename)
+        return {"size": len(await file.read())}
+
+    app.add_middleware(UploadSizeLimitMiddleware, path="/upload", max_body_size=LIMIT)
+    return TestClient(app), parsed
+
+
+def test_small_upload_passes():
+    client, parsed = _make_client()
+    resp = client.post("/upload", files={"file": ("a.txt", b"x" * LIMIT)})
+    assert resp.status_code == 200 and resp.json() == {"size": LIMIT}
+    assert parsed == ["a.txt"]
+
+
+def test_declared_content_length_rejected_before_parsing():
+    client, parsed = _make_client()
+    resp = client.post("/upload", files={"file": ("a.txt", b"x" * (LIMIT + MULTIPART_OVERHEAD + 1))})
+    assert resp.status_code == 413
+    assert parsed == []
+
+
+def test_streamed_body_counted_without_content_length():
+    client, parsed = _make_client()
+    boundary = "bound"
+    payload = b"x" * (LIMIT + MULTIPART_OVERHEAD + 1)
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.txt\"\r\n\r\n".encode()
+        + payload + f"\r\n--{boundary}--\r\n".encode()
+    )
+
+    def chunks():
+        for i in range(0, len(body), 8192):
+            yield body[i:i + 8192]
+
+    resp = client.post(
+        "/upload", content=chunks(), headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    assert resp.status_code == 413
+    assert parsed == []
+
+
+def test_other_paths_unaffected():
+    client, _ = _make_client()
+    resp = client.post("/other", content=b"x" * (LIMIT + MULTIPART_OVERHEAD + 1))
+    assert resp.status_code == 404
+
+
+def test_hash_then_parse_reuses_spooled_file():
+    import asyncio
+    import hashlib
+    import io
+
+    from starlette.datastructures import UploadFile as StarletteUploadFile
+
+    from app.services.document_service import hash_upload_file, parse_document
+
+    data = "知识库文本。".encode("utf-8") * 50
+    upload = StarletteUploadFile(file=io.BytesIO(data), filename="a.txt", size=len(data))
+
+    async def run():
+        digest = await hash_upload_file(upload)
+        chunks = await asyncio.to_thread(parse_document, upload.file, "a.txt")
+        return digest, chunks
+
+    digest, chunks = asyncio.run(run())
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert "".join(chunks).startswith("知识库文本。")
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import warmup_service
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    """用记录调用的假步骤替换 WARMUP_STEPS，并重置预热状态"""
+    monkeypatch.setattr(warmup_service, "_state", {
+        "status": "pending", "current_step": None, "completed_steps": [], "step_seconds": {},
+        "error": None, "started_at": None, "finished_at": None,
+    })
+    calls = []
+
+    def install(*specs):
+        def make(name, outcomes):
+            def step():
+                calls.append((name, warmup_service.get_warmup_state()["current_step"]))
+                if outcomes:
+                    raise outcomes.pop(0)
+            return step
+        monkeypatch.setattr(warmup_service, "WARMUP_STEPS", [(name, make(name, list(o))) for name, o in specs])
+
+    install.calls = calls
+    return install
+
+
+def test_failed_step_retried_until_it_succeeds(steps):
+    steps(("a", []), ("b", [RuntimeError("milvus down"), RuntimeError("milvus down")]), ("c", []))
+    asyncio.run(warmup_service.run_warmup(retry_interval=0))
+
+    state = warmup_service.get_warmup_state()
+    assert steps.calls == [("a", "a"), ("b", "b"), ("b", "b"), ("b", "b"), ("c", "c")]
+    assert state["status"] == "ready" and state["error"] is None and state["current_step"] is None
+    assert state["completed_steps"] == ["a", "b", "c"]
+    assert set(state["step_seconds"]) == {"a", "b", "c"} and state["total_steps"] == 3
+
+
+def test_value_error_stops_without_retry_and_rerun_resumes(steps):
+    steps(("a", []), ("b", [ValueError("维度不符")]), ("c", []))
+    asyncio.run(warmup_service.run_warmup(retry_interval=0))
+
+    state = warmup_service.get_warmup_state()
+    assert steps.calls == [("a", "a"), ("b", "b")]
+    assert state["status"] == "failed" and state["error"] == "b: 维度不符"
+    assert state["completed_steps"] == ["a"] and state["current_step"] == "b"
+
+    # 重新预热时跳过已完成的步骤
+    asyncio.run(warmup_service.run_warmup(retry_interval=0))
+    assert steps.calls[2:] == [("b", "b"), ("c", "c")]
+    assert warmup_service.is_ready()
+
+
+def test_ready_probe_switches_from_503_to_200(steps):
+    steps(("a", []), ("b", []))
+    client = TestClient(app)  # 不触发 lifespan，预热由测试手动执行
+
+    resp = client.get("/api/health/ready")
+    assert resp.status_code == 503
+    body = resp.json()
+    assert body["status"] == "warming_up"
+    assert body["warmup"]["status"] == "pending" and body["warmup"]["total_steps"] == 2
+
+    asyncio.run(warmup_service.run_warmup(retry_interval=0))
+    resp = client.get("/api/health/ready")
+    assert resp.status_code == 200
+    assert resp.json()["warmup"]["completed_steps"] == ["a", "b"]
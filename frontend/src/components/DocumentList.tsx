@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react'
 import { Trash2, RefreshCw, FileText, Layers, Clock, Eye } from 'lucide-react'
 import { documentApi } from '../services/api'
-import { DocumentPreviewModal } from './DocumentPreviewModal'
+import { DocumentPreviewModal, PREVIEW_PAGE_SIZE } from './DocumentPreviewModal'
 import type { DocumentInfo, DocumentPreview } from '../types'
 
 interface DocumentListProps {
@@ -55,7 +55,7 @@ export function DocumentList({ refreshTrigger }: DocumentListProps) {
   const handlePreview = async (docId: string) => {
     setPreviewing(docId)
     try {
-      const data = await documentApi.preview(docId)
+      const data = await documentApi.preview(docId, { after: -1, limit: PREVIEW_PAGE_SIZE })
       setPreviewData(data)
     } catch {
       alert('加载预览失败，请重试')
@@ -175,6 +175,7 @@ export function DocumentList({ refreshTrigger }: DocumentListProps) {
       {/* 预览 Modal */}
       {previewData && (
         <DocumentPreviewModal
+          key={previewData.doc_id}
           preview={previewData}
           onClose={() => setPreviewData(null)}
         />
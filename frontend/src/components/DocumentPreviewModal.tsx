@@ -1,8 +1,13 @@
-import React, { useEffect, useRef } from 'react'
-import { X, FileText, Layers, Copy, Check } from 'lucide-react'
-import type { DocumentPreview } from '../types'
+import React, { useEffect, useRef, useState } from 'react'
+import { X, FileText, Layers, Copy, Check, Loader2 } from 'lucide-react'
+import { documentApi } from '../services/api'
+import type { DocumentChunk, DocumentPreview } from '../types'
+
+// 每页块数：预览按 chunk_index 游标分页加载，避免大文档一次性返回全部块
+export const PREVIEW_PAGE_SIZE = 100
 
 interface DocumentPreviewModalProps {
+  // 首页数据（含 next_cursor），后续页在弹窗内按需加载
   preview: DocumentPreview
   onClose: () => void
 }
@@ -17,6 +22,9 @@ const DOC_TYPE_COLORS: Record<string, string> = {
 
 export function DocumentPreviewModal({ preview, onClose }: DocumentPreviewModalProps) {
   const [copied, setCopied] = React.useState(false)
+  const [chunks, setChunks] = useState<DocumentChunk[]>(preview.chunks)
+  const [cursor, setCursor] = useState<number | null>(preview.next_cursor ?? null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const overlayRef = useRef<HTMLDivElement>(null)
 
   // ESC 关闭
@@ -37,9 +45,32 @@ export function DocumentPreviewModal({ preview, onClose }: DocumentPreviewModalP
     if (e.target === overlayRef.current) onClose()
   }
 
-  // 复制全文
+  // 从游标处继续加载；untilEnd 为 true 时一直加载到最后一页
+  const loadMore = async (untilEnd = false): Promise<DocumentChunk[]> => {
+    let all = chunks
+    let next = cursor
+    setLoadingMore(true)
+    try {
+      do {
+        if (next === null) break
+        const page = await documentApi.preview(preview.doc_id, { after: next, limit: PREVIEW_PAGE_SIZE })
+        all = [...all, ...page.chunks]
+        next = page.next_cursor ?? null
+        setChunks(all)
+        setCursor(next)
+      } while (untilEnd)
+    } catch {
+      alert('加载文本块失败，请重试')
+    } finally {
+      setLoadingMore(false)
+    }
+    return all
+  }
+
+  // 复制全文（未加载完的先加载剩余页）
   const handleCopy = async () => {
-    const full = preview.chunks.map((c) => c.content).join('\n\n')
+    const all = cursor === null ? chunks : await loadMore(true)
+    const full = all.map((c) => c.content).join('\n\n')
     await navigator.clipboard.writeText(full)
     setCopied(true)
     setTimeout(() => setCopied(false), 2000)
@@ -82,6 +113,7 @@ export function DocumentPreviewModal({ preview, onClose }: DocumentPreviewModalP
           <div className="flex items-center gap-1 flex-shrink-0">
             <button
               onClick={handleCopy}
+              disabled={loadingMore}
               className="flex items-center gap-1.5 text-xs px-2.5 py-1.5 text-gray-500
                 hover:text-gray-700 hover:bg-gray-100 rounded-lg transition-colors"
               title="复制全文"
@@ -103,7 +135,7 @@ export function DocumentPreviewModal({ preview, onClose }: DocumentPreviewModalP
 
         {/* 内容区 */}
         <div className="flex-1 overflow-y-auto px-5 py-4 space-y-0">
-          {preview.chunks.map((chunk, idx) => (
+          {chunks.map((chunk, idx) => (
             <div key={chunk.chunk_index}>
               {/* 块分隔线（首块不显示） */}
               {idx > 0 && (
@@ -120,6 +152,19 @@ export function DocumentPreviewModal({ preview, onClose }: DocumentPreviewModalP
               </p>
             </div>
           ))}
+          {cursor !== null && (
+            <div className="flex justify-center pt-4">
+              <button
+                onClick={() => loadMore()}
+                disabled={loadingMore}
+                className="flex items-center gap-1.5 text-xs px-3 py-1.5 text-blue-600
+                  hover:bg-blue-50 rounded-lg transition-colors disabled:opacity-50"
+              >
+                {loadingMore && <Loader2 size={13} className="animate-spin" />}
+                加载更多（已显示 {chunks.length} / {preview.chunk_count}）
+              </button>
+            </div>
+          )}
         </div>
 
         {/* Footer */}
@@ -30,8 +30,12 @@ export const documentApi = {
     await api.delete(`/documents/${docId}`)
   },
 
-  preview: async (docId: string): Promise<DocumentPreview> => {
-    const { data } = await api.get<DocumentPreview>(`/documents/${docId}/preview`)
+  // 不传 page 返回全部块；传入 { after, limit } 按 chunk_index 游标分页
+  preview: async (
+    docId: string,
+    page?: { after?: number; limit?: number }
+  ): Promise<DocumentPreview> => {
+    const { data } = await api.get<DocumentPreview>(`/documents/${docId}/preview`, { params: page })
     return data
   },
 }
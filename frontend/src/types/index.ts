@@ -17,6 +17,7 @@ export interface DocumentPreview {
   doc_type: string
   chunk_count: number
   chunks: DocumentChunk[]
+  next_cursor?: number | null
 }
 
 export interface UploadResponse {